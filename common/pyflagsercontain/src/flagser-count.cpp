@@ -12,6 +12,8 @@
 #include <sstream>
 #include <cmath>
 #include <array>
+#include <atomic>
+#include <stdexcept>
 
 //##############################################################################
 // DEFINITIONS
@@ -21,6 +23,17 @@ typedef float value_t;
 
 #define PARALLEL_THREADS 8
 
+// A read-only view of a numpy array of indices (int32 or int64), such that CSR arrays can be used without copying them
+struct index_array_t {
+	const void* data;
+	bool is_64;
+	size_t size;
+
+	int64_t operator[](size_t i) const {
+		return is_64 ? static_cast<const int64_t*>(data)[i] : static_cast<const int32_t*>(data)[i];
+	}
+};
+
 
 
 //##############################################################################
@@ -62,6 +75,46 @@ public:
 	size_t get_outgoing_chunk(vertex_index_t from, size_t chunk_number) const {
 		return incidence_outgoing[incidence_row_length * from + chunk_number];
 	}
+
+	size_t out_degree(vertex_index_t from) const {
+		size_t degree = 0;
+		for (size_t offset = 0; offset < incidence_row_length; offset++)
+			degree += __builtin_popcountl(get_outgoing_chunk(from, offset));
+		return degree;
+	}
+};
+
+//##############################################################################
+//SIMPLEX CONTAINMENT COUNTERS
+
+// Number of simplices of each dimension that each vertex is part of. One contiguous array of counters per dimension,
+// allocated when the first simplex of that dimension is found.
+struct containment_counter_t {
+	size_t number_of_vertices;
+	std::vector<std::vector<uint64_t>> by_dimension;
+
+	containment_counter_t(size_t _number_of_vertices = 0) : number_of_vertices(_number_of_vertices) {}
+
+	void add(const vertex_index_t* prefix, unsigned short prefix_size) {
+		while (by_dimension.size() < prefix_size) by_dimension.emplace_back(number_of_vertices, 0);
+		auto& counts = by_dimension[prefix_size - 1];
+		for (unsigned short i = 0; i < prefix_size; i++) counts[prefix[i]]++;
+	}
+
+	void merge(const containment_counter_t& other) {
+		while (by_dimension.size() < other.by_dimension.size()) by_dimension.emplace_back(number_of_vertices, 0);
+		for (size_t d = 0; d < other.by_dimension.size(); d++)
+			for (size_t v = 0; v < number_of_vertices; v++) by_dimension[d][v] += other.by_dimension[d][v];
+	}
+
+	size_t dimensions() const { return by_dimension.size(); }
+
+	// Write the counts as rows of a (number of vertices x row_length) array in row-major order
+	void write_rows(int64_t* out, size_t row_length) const {
+		for (size_t v = 0; v < number_of_vertices; v++)
+			for (size_t d = 0; d < row_length; d++)
+				out[v * row_length + d] = d < by_dimension.size() ? by_dimension[d][v] : 0;
+	}
 };
 
 //##############################################################################
@@ -70,26 +123,44 @@ public:
 class directed_flag_complex_t {
 public:
 	const directed_graph_t& graph;
-	directed_flag_complex_t(const directed_graph_t& _graph) : graph(_graph) {}
+	// Maximal number of simplices enumerated starting from each vertex (as the first vertex of the simplices); 0: no
+	// limit. Once reached, the remaining simplices starting from that vertex are skipped, i.e. not counted.
+	size_t max_simplices_per_vertex;
+	directed_flag_complex_t(const directed_graph_t& _graph, size_t _max_simplices_per_vertex = 0)
+	    : graph(_graph), max_simplices_per_vertex(_max_simplices_per_vertex) {}
 
 public:
-	template <typename Func> void for_each_cell(Func& f, std::vector<vertex_index_t>& do_vertices, std::vector<std::vector<std::vector<vertex_index_t>>>& contain_counts, int min_dimension, int max_dimension = -1) {
-		std::array<Func*, 1> fs{&f};
+	template <typename Func> void for_each_cell(Func& f, std::vector<vertex_index_t>& do_vertices, std::vector<containment_counter_t>& contain_counts, int min_dimension, int max_dimension = -1) {
+		std::vector<Func*> fs{&f};
 		for_each_cell(fs, do_vertices, contain_counts, min_dimension, max_dimension);
 	}
 
-	template <typename Func, size_t number_of_threads>
-	void for_each_cell(std::array<Func*, number_of_threads>& fs, std::vector<vertex_index_t>& do_vertices, std::vector<std::vector<std::vector<vertex_index_t>>>& contain_counts, int min_dimension, int max_dimension = -1) {
+	template <typename Func>
+	void for_each_cell(std::vector<Func*>& fs, std::vector<vertex_index_t>& do_vertices, std::vector<containment_counter_t>& contain_counts, int min_dimension, int max_dimension = -1) {
 		if (max_dimension == -1) max_dimension = min_dimension;
-		std::thread t[number_of_threads - 1];
+		const size_t number_of_threads = fs.size();
+		std::vector<std::thread> t(number_of_threads - 1);
+
+		// The work starting from a vertex grows steeply with its out-degree, and degree distributions are heavy-tailed.
+		// The first vertices are therefore handed out to the threads one at a time, most expensive first, such that no
+		// thread is left with a few expensive vertices at the end.
+		std::vector<vertex_index_t> ordered_vertices(do_vertices);
+		if (number_of_threads > 1) {
+			std::vector<size_t> cost(graph.vertex_number(), 0);
+			for (auto v : ordered_vertices) cost[v] = graph.out_degree(v);
+			std::stable_sort(ordered_vertices.begin(), ordered_vertices.end(),
+			                 [&cost](vertex_index_t a, vertex_index_t b) { return cost[a] > cost[b]; });
+		}
+		std::atomic<size_t> next_vertex(0);
 
 		for (size_t index = 0; index < number_of_threads - 1; ++index)
-			t[index] = std::thread(&directed_flag_complex_t::worker_thread<Func>, this, number_of_threads, index,
-			                       fs[index], min_dimension, max_dimension, std::ref(do_vertices), std::ref(contain_counts));
+			t[index] = std::thread(&directed_flag_complex_t::worker_thread<Func>, this, index, fs[index], min_dimension,
+			                       max_dimension, std::cref(ordered_vertices), std::ref(next_vertex),
+			                       std::ref(contain_counts));
 
-		// Also do work in this thread, namely the last bit
-		worker_thread(number_of_threads, number_of_threads - 1, fs[number_of_threads - 1], min_dimension,
-		              max_dimension, do_vertices, contain_counts);
+		// Also do work in this thread
+		worker_thread(number_of_threads - 1, fs[number_of_threads - 1], min_dimension, max_dimension, ordered_vertices,
+		              next_vertex, contain_counts);
 
 		// Wait until all threads stopped
 		for (size_t i = 0; i < number_of_threads - 1; ++i) t[i].join();
@@ -97,38 +168,47 @@ public:
 
 private:
 	template <typename Func>
-	void worker_thread(int number_of_threads, int thread_id, Func* f, int min_dimension, int max_dimension,
-                       std::vector<vertex_index_t>& do_vertices, std::vector<std::vector<std::vector<vertex_index_t>>>& contain_counts) {
-		const size_t vertices_per_thread = graph.vertex_number() / number_of_threads;
-
-		std::vector<vertex_index_t> first_position_vertices;
-		for (size_t index = thread_id; index < do_vertices.size(); index += number_of_threads)
-			first_position_vertices.push_back(do_vertices[index]);
-
+	// Takes the next unprocessed first vertex from do_vertices until none are left
+	void worker_thread(int thread_id, Func* f, int min_dimension, int max_dimension,
+	                   const std::vector<vertex_index_t>& do_vertices, std::atomic<size_t>& next_vertex,
+	                   std::vector<containment_counter_t>& contain_counts) {
+		std::vector<vertex_index_t> first_position_vertex(1);
 		vertex_index_t prefix[max_dimension + 1];
+		size_t budget = 0;
 
-		do_for_each_cell(f, min_dimension, max_dimension, first_position_vertices, prefix, 0, thread_id, do_vertices.size(), contain_counts);
+		for (size_t index = next_vertex++; index < do_vertices.size(); index = next_vertex++) {
+			first_position_vertex[0] = do_vertices[index];
+			do_for_each_cell(f, min_dimension, max_dimension, first_position_vertex, prefix, 0, thread_id,
+			                 do_vertices.size(), contain_counts, budget);
+		}
 
 		f->done();
 	}
 
+	// Returns false if the enumeration of simplices starting from the current first vertex has to stop, because
+	// max_simplices_per_vertex was reached
 	template <typename Func>
-	void do_for_each_cell(Func* f, int min_dimension, int max_dimension,
+	bool do_for_each_cell(Func* f, int min_dimension, int max_dimension,
 	                      const std::vector<vertex_index_t>& possible_next_vertices, vertex_index_t* prefix,
-	                      unsigned short prefix_size, int thread_id, size_t number_of_vertices, std::vector<std::vector<std::vector<vertex_index_t>>>& contain_counts) {
+	                      unsigned short prefix_size, int thread_id, size_t number_of_vertices, std::vector<containment_counter_t>& contain_counts,
+	                      size_t& budget) {
+		if (prefix_size > 0 && max_simplices_per_vertex > 0) {
+			if (budget == 0) return false;
+			budget--;
+		}
 		// As soon as we have the correct dimension, execute f
-		if (prefix_size >= min_dimension + 1) { (*f)(prefix, prefix_size); }
-        for(int i = 0; i < prefix_size; i++){
-            while(contain_counts[thread_id][prefix[i]].size() < prefix_size){
-                contain_counts[thread_id][prefix[i]].push_back(0);
-            }
-            contain_counts[thread_id][prefix[i]][prefix_size-1]++;
-        }
+		if (prefix_size >= min_dimension + 1) {
+			(*f)(prefix, prefix_size);
+			contain_counts[thread_id].add(prefix, prefix_size);
+		}
 
 		// If this is the last dimension we are interested in, exit this branch
-		if (prefix_size == max_dimension + 1) return;
+		if (prefix_size == max_dimension + 1) return true;
 
         for (auto vertex : possible_next_vertices) {
+			// Each first vertex gets its own budget
+			if (prefix_size == 0) budget = max_simplices_per_vertex;
+
 			// We can write the cell given by taking the current vertex as the maximal element
 			prefix[prefix_size] = vertex;
 
@@ -156,8 +236,11 @@ private:
 				}
 			}
 
-            do_for_each_cell(f, min_dimension, max_dimension, new_possible_vertices, prefix, prefix_size + 1, thread_id, number_of_vertices, contain_counts);
+            if (!do_for_each_cell(f, min_dimension, max_dimension, new_possible_vertices, prefix, prefix_size + 1, thread_id, number_of_vertices, contain_counts, budget)
+                && prefix_size > 0)
+                return false;
 		}
+		return true;
 	}
 };
 
@@ -189,35 +272,125 @@ private:
 //##############################################################################
 //COUNT CELL FUNCTION
 
-std::vector<std::vector<vertex_index_t>> count_cells(directed_graph_t& graph) {
-	directed_flag_complex_t complex(graph);
+// Counts simplices of dimensions min_dimension to max_dimension (-1: no limit). Lower dimensions are enumerated, but
+// not counted, i.e. their counts are 0.
+containment_counter_t count_cells(directed_graph_t& graph, int number_of_threads = PARALLEL_THREADS,
+                                  int min_dimension = 0, int max_dimension = -1, size_t max_simplices_per_vertex = 0) {
+	directed_flag_complex_t complex(graph, max_simplices_per_vertex);
+	if (number_of_threads < 1) number_of_threads = 1;
+	if (max_dimension < 0) max_dimension = 10000;
 
 
    std::vector<vertex_index_t> do_vertices;
    for(int i = 0; i < graph.vertex_number(); i++){ do_vertices.push_back(i); }
 
 
-    std::vector<std::vector<std::vector<vertex_index_t>>> contain_counts(PARALLEL_THREADS,
-			                                                     std::vector<std::vector<vertex_index_t>>(graph.vertex_number(),
-																														std::vector<vertex_index_t>(0)));
+    std::vector<containment_counter_t> contain_counts(number_of_threads, containment_counter_t(graph.vertex_number()));
 
-	std::array<cell_counter_t*, PARALLEL_THREADS> cell_counter;
-	for (int i = 0; i < PARALLEL_THREADS; i++)
-		cell_counter[i] = new cell_counter_t();
+	std::vector<cell_counter_t> counters(number_of_threads);
+	std::vector<cell_counter_t*> cell_counter;
+	for (int i = 0; i < number_of_threads; i++)
+		cell_counter.push_back(&counters[i]);
 
-		complex.for_each_cell(cell_counter, do_vertices, contain_counts, 0, 10000);
+		complex.for_each_cell(cell_counter, do_vertices, contain_counts, min_dimension, max_dimension);
 
 
     for(int i = 1; i < contain_counts.size(); i++){
-        for(int j = 0; j < contain_counts[i].size(); j++){
-            while(contain_counts[0][j].size() < contain_counts[i][j].size()){
-                contain_counts[0][j].push_back(0);
-            }
-            for(int k = 0; k < contain_counts[i][j].size(); k++){
-                contain_counts[0][j][k] += contain_counts[i][j][k];
-            }
-        }
+        contain_counts[0].merge(contain_counts[i]);
     }
 
 	return contain_counts[0];
 }
+
+//##############################################################################
+//GRAPHS FROM COMPRESSED SPARSE ROW ARRAYS
+
+// Throws if the CSR arrays are inconsistent or refer to vertices outside of [0, num_vertices)
+void check_csr(vertex_index_t num_vertices, const index_array_t& indptr, const index_array_t& indices) {
+	if (indptr.size != num_vertices + 1) throw std::invalid_argument("indptr must have length num_vertices + 1");
+	for (size_t v = 0; v < num_vertices; v++)
+		if (indptr[v] < 0 || indptr[v] > indptr[v + 1]) throw std::invalid_argument("indptr must be non-decreasing");
+	if (num_vertices > 0 && indptr[num_vertices] > (int64_t)indices.size)
+		throw std::invalid_argument("indptr points beyond the end of indices");
+	for (size_t e = 0; e < indices.size; e++)
+		if (indices[e] < 0 || indices[e] >= (int64_t)num_vertices) throw std::out_of_range("vertex index out of range");
+}
+
+directed_graph_t graph_from_csr(vertex_index_t num_vertices, const index_array_t& indptr, const index_array_t& indices) {
+	directed_graph_t graph(num_vertices);
+	for (vertex_index_t v = 0; v < num_vertices; v++)
+		for (int64_t e = indptr[v]; e < indptr[v + 1]; e++) graph.add_edge(v, indices[e]);
+	return graph;
+}
+
+// Simplex containment in the subgraphs induced by a number of vertex subsets (e.g. tribes). Subset i consists of the
+// vertices subset_indices[subset_indptr[i]:subset_indptr[i + 1]]. The subsets are distributed over the threads, each
+// subset is counted in a single thread. The result has one row per entry of subset_indices, i.e. the rows of subset i
+// are rows subset_indptr[i]:subset_indptr[i + 1]. Its number of columns is returned in dimensions.
+std::vector<int64_t> count_cells_in_subsets(vertex_index_t num_vertices,
+                                            const index_array_t& indptr,
+                                            const index_array_t& indices,
+                                            const index_array_t& subset_indptr,
+                                            const index_array_t& subset_indices,
+                                            size_t& dimensions,
+                                            int number_of_threads = PARALLEL_THREADS,
+                                            int min_dimension = 0, int max_dimension = -1,
+                                            size_t max_simplices_per_vertex = 0) {
+	check_csr(num_vertices, indptr, indices);
+	if (subset_indptr.size == 0) throw std::invalid_argument("subset_indptr must not be empty");
+	const size_t number_of_subsets = subset_indptr.size - 1;
+	// The members of the subsets are vertices of the graph, so unlike an adjacency matrix the subset CSR is not square
+	if (subset_indptr[0] != 0) throw std::invalid_argument("subset_indptr must start at 0");
+	for (size_t s = 0; s < number_of_subsets; s++)
+		if (subset_indptr[s] > subset_indptr[s + 1]) throw std::invalid_argument("subset_indptr must be non-decreasing");
+	if (subset_indptr[number_of_subsets] != (int64_t)subset_indices.size)
+		throw std::invalid_argument("subset_indptr must end at the length of subset_indices");
+	for (size_t i = 0; i < subset_indices.size; i++)
+		if (subset_indices[i] < 0 || subset_indices[i] >= (int64_t)num_vertices)
+			throw std::out_of_range("subset vertex index out of range");
+	if (number_of_threads < 1) number_of_threads = 1;
+
+	std::vector<containment_counter_t> result(number_of_subsets);
+	// Largest subsets first, such that no thread is left counting a large one at the end
+	std::vector<size_t> subset_order(number_of_subsets);
+	for (size_t s = 0; s < number_of_subsets; s++) subset_order[s] = s;
+	std::stable_sort(subset_order.begin(), subset_order.end(), [&subset_indptr](size_t a, size_t b) {
+		return subset_indptr[a + 1] - subset_indptr[a] > subset_indptr[b + 1] - subset_indptr[b];
+	});
+	std::atomic<size_t> next_subset(0);
+
+	auto worker = [&]() {
+		// Position of each vertex in the subset currently counted; -1 for vertices outside of it
+		std::vector<int64_t> position(num_vertices, -1);
+		for (size_t k = next_subset++; k < number_of_subsets; k = next_subset++) {
+			const size_t s = subset_order[k];
+			const int64_t first = subset_indptr[s];
+			const vertex_index_t n = subset_indptr[s + 1] - first;
+			for (vertex_index_t i = 0; i < n; i++) position[subset_indices[first + i]] = i;
+
+			directed_graph_t graph(n);
+			for (vertex_index_t i = 0; i < n; i++) {
+				const int64_t v = subset_indices[first + i];
+				for (int64_t e = indptr[v]; e < indptr[v + 1]; e++) {
+					const int64_t w = position[indices[e]];
+					if (w >= 0) graph.add_edge(i, w);
+				}
+			}
+			result[s] = count_cells(graph, 1, min_dimension, max_dimension, max_simplices_per_vertex);
+			for (vertex_index_t i = 0; i < n; i++) position[subset_indices[first + i]] = -1;
+		}
+	};
+
+	std::vector<std::thread> threads;
+	for (int i = 0; i < number_of_threads - 1; i++) threads.push_back(std::thread(worker));
+	worker();
+	for (auto& t : threads) t.join();
+
+	dimensions = 0;
+	for (auto& counter : result) dimensions = std::max(dimensions, counter.dimensions());
+	const size_t number_of_rows = subset_indices.size;
+	std::vector<int64_t> rows(number_of_rows * dimensions, 0);
+	for (size_t s = 0; s < number_of_subsets; s++)
+		result[s].write_rows(rows.data() + subset_indptr[s] * dimensions, dimensions);
+	return rows;
+}
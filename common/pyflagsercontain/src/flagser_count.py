@@ -1,7 +1,71 @@
 """Implementation of the python API for the cell count of the flagser C++ library."""
 
 import numpy as np
-from pyflagsercontain import compute_cell_count
+from pyflagsercontain import compute_cell_count, compute_cell_count_csr, compute_cell_count_subsets, DEFAULT_THREADS
 
-def flagser_count(adjacency_matrix):
-    return compute_cell_count(adjacency_matrix.shape[0], np.transpose(np.array(np.nonzero(adjacency_matrix))))
+
+def _index_array(arr):
+    arr = np.asarray(arr)
+    if arr.dtype not in (np.int32, np.int64):
+        arr = arr.astype(np.int64)
+    return np.ascontiguousarray(arr)
+
+
+def _csr_arrays(adjacency_matrix):
+    """indptr and indices of the non-zero entries of a dense or scipy.sparse matrix. Not copied if already CSR."""
+    if hasattr(adjacency_matrix, "tocsr"):
+        csr = adjacency_matrix.tocsr()
+        if not np.all(csr.data):
+            csr = csr.copy()
+            csr.eliminate_zeros()
+        return _index_array(csr.indptr), _index_array(csr.indices)
+    rows, cols = np.nonzero(np.asarray(adjacency_matrix))
+    indptr = np.searchsorted(rows, np.arange(np.asarray(adjacency_matrix).shape[0] + 1))
+    return _index_array(indptr), _index_array(cols)
+
+
+def _dimension_args(min_dimension, max_dimension, max_simplices_per_vertex):
+    if max_dimension is None:
+        max_dimension = -1
+    else:
+        assert max_dimension >= min_dimension, "max_dimension must not be smaller than min_dimension!"
+    assert min_dimension >= 0, "min_dimension must not be negative!"
+    return {"min_dimension": int(min_dimension), "max_dimension": int(max_dimension),
+            "max_simplices_per_vertex": int(max_simplices_per_vertex or 0)}
+
+
+def flagser_count(adjacency_matrix, threads=DEFAULT_THREADS, min_dimension=0, max_dimension=None,
+                  max_simplices_per_vertex=None):
+    """
+    :param adjacency_matrix: numpy.array or scipy.sparse matrix; adjacency matrix of a directed graph
+    :param threads: int; number of threads to count in
+    :param min_dimension: int; simplices of lower dimensions are not counted, i.e. their counts are 0
+    :param max_dimension: int; simplices of higher dimensions are not enumerated at all. Default: no limit
+    :param max_simplices_per_vertex: int; stop enumerating the simplices starting at a vertex (in the order of the
+    graph) after this many. The counts are then lower bounds. Default: no limit
+    :return: numpy.array of shape (number of vertices, number of dimensions); entry (i, k) is the number of k-simplices
+    containing vertex i. The number of non-zero entries of row i is the dimension of the largest simplex containing
+    vertex i plus one.
+    """
+    indptr, indices = _csr_arrays(adjacency_matrix)
+    return compute_cell_count_csr(adjacency_matrix.shape[0], indptr, indices, threads,
+                                  **_dimension_args(min_dimension, max_dimension, max_simplices_per_vertex))
+
+
+def flagser_count_subsets(adjacency_matrix, subset_indptr, subset_indices, threads=DEFAULT_THREADS, min_dimension=0,
+                          max_dimension=None, max_simplices_per_vertex=None):
+    """
+    Simplex containment in the subgraphs induced by many subsets of vertices (e.g. tribes), in a single call
+    :param adjacency_matrix: numpy.array or scipy.sparse matrix; adjacency matrix of a directed graph
+    :param subset_indptr: numpy.array; subset i consists of the vertices subset_indices[subset_indptr[i]:subset_indptr[i + 1]]
+    :param subset_indices: numpy.array; indices of the vertices of all subsets, concatenated
+    :param threads: int; number of threads. Each subset is counted in a single thread
+    :param min_dimension, max_dimension, max_simplices_per_vertex: see flagser_count
+    :return: numpy.array with one row per entry of subset_indices; rows subset_indptr[i]:subset_indptr[i + 1] are the
+    simplex containment (see flagser_count) of the vertices of subset i in its induced subgraph. All subsets are padded
+    to the same number of dimensions
+    """
+    indptr, indices = _csr_arrays(adjacency_matrix)
+    return compute_cell_count_subsets(adjacency_matrix.shape[0], indptr, indices, _index_array(subset_indptr),
+                                      _index_array(subset_indices), threads,
+                                      **_dimension_args(min_dimension, max_dimension, max_simplices_per_vertex))
@@ -4,14 +4,41 @@
 #include "flagser-count.cpp"
 
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <pybind11/stl.h>
 
 namespace py = pybind11;
 
+// View of a one-dimensional, contiguous numpy array of int32 or int64 without copying it
+index_array_t as_index_array(const py::array& arr, const char* name) {
+  if (arr.ndim() != 1) throw std::invalid_argument(std::string(name) + " must be one-dimensional");
+  if (!(arr.flags() & py::array::c_style)) throw std::invalid_argument(std::string(name) + " must be contiguous");
+  if (arr.dtype().kind() != 'i' || (arr.itemsize() != 4 && arr.itemsize() != 8))
+    throw std::invalid_argument(std::string(name) + " must be of type int32 or int64");
+  return index_array_t{arr.data(), arr.itemsize() == 8, (size_t)arr.size()};
+}
+
+// Hand a buffer over to numpy without copying it: the array owns the vector
+py::array_t<int64_t> as_numpy(std::vector<int64_t>&& values, size_t rows, size_t columns) {
+  auto owner = new std::vector<int64_t>(std::move(values));
+  py::capsule free_when_done(owner, [](void* p) { delete static_cast<std::vector<int64_t>*>(p); });
+  return py::array_t<int64_t>({rows, columns}, {columns * sizeof(int64_t), sizeof(int64_t)}, owner->data(),
+                              free_when_done);
+}
+
+// Simplex containment as a (vertices x dimensions) array: entry (i, k) is the number of k-simplices containing vertex i
+py::array_t<int64_t> containment_to_numpy(const containment_counter_t& counter) {
+  std::vector<int64_t> rows(counter.number_of_vertices * counter.dimensions());
+  counter.write_rows(rows.data(), counter.dimensions());
+  return as_numpy(std::move(rows), counter.number_of_vertices, counter.dimensions());
+}
+
 PYBIND11_MODULE(pyflagsercontain, m) {
 
   m.doc() = "Python interface for flagser_count";
 
+  m.attr("DEFAULT_THREADS") = PARALLEL_THREADS;
+
   m.def("compute_cell_count", [](vertex_index_t num_vertices,
                                  std::vector<std::vector<value_t>>& edges) {
     // Save std::cout status
@@ -33,6 +60,48 @@ PYBIND11_MODULE(pyflagsercontain, m) {
     // Re-enable again cout
     std::cout.rdbuf(cout_buff);
 
-    return cell_count;
+    return containment_to_numpy(cell_count);
   });
+
+  m.def("compute_cell_count_csr", [](vertex_index_t num_vertices, py::array indptr, py::array indices,
+                                     int threads, int min_dimension, int max_dimension,
+                                     size_t max_simplices_per_vertex) {
+    auto indptr_view = as_index_array(indptr, "indptr");
+    auto indices_view = as_index_array(indices, "indices");
+    check_csr(num_vertices, indptr_view, indices_view);
+
+    containment_counter_t cell_count;
+    {
+      // The arrays are kept alive by the caller; no python objects are touched while counting
+      py::gil_scoped_release release;
+      auto graph = graph_from_csr(num_vertices, indptr_view, indices_view);
+      cell_count = count_cells(graph, threads, min_dimension, max_dimension, max_simplices_per_vertex);
+    }
+    return containment_to_numpy(cell_count);
+  }, py::arg("num_vertices"), py::arg("indptr"), py::arg("indices"), py::arg("threads") = PARALLEL_THREADS,
+  py::arg("min_dimension") = 0, py::arg("max_dimension") = -1, py::arg("max_simplices_per_vertex") = 0,
+  "Simplex containment of the graph given by the CSR arrays of its adjacency matrix, as a (vertices x dimensions) array");
+
+  m.def("compute_cell_count_subsets", [](vertex_index_t num_vertices, py::array indptr, py::array indices,
+                                         py::array subset_indptr, py::array subset_indices, int threads,
+                                         int min_dimension, int max_dimension, size_t max_simplices_per_vertex) {
+    auto indptr_view = as_index_array(indptr, "indptr");
+    auto indices_view = as_index_array(indices, "indices");
+    auto subset_indptr_view = as_index_array(subset_indptr, "subset_indptr");
+    auto subset_indices_view = as_index_array(subset_indices, "subset_indices");
+
+    std::vector<int64_t> rows;
+    size_t dimensions = 0;
+    {
+      py::gil_scoped_release release;
+      rows = count_cells_in_subsets(num_vertices, indptr_view, indices_view, subset_indptr_view, subset_indices_view,
+                                    dimensions, threads, min_dimension, max_dimension,
+                                    max_simplices_per_vertex);
+    }
+    return as_numpy(std::move(rows), subset_indices_view.size, dimensions);
+  }, py::arg("num_vertices"), py::arg("indptr"), py::arg("indices"), py::arg("subset_indptr"),
+  py::arg("subset_indices"), py::arg("threads") = PARALLEL_THREADS, py::arg("min_dimension") = 0,
+  py::arg("max_dimension") = -1, py::arg("max_simplices_per_vertex") = 0,
+  "Simplex containment in the subgraphs induced by a number of vertex subsets, given in CSR layout. One row per entry "
+  "of subset_indices");
 }
@@ -0,0 +1,71 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+import pytest
+from scipy import sparse
+
+from pyflagsercontain import flagser_count, flagser_count_subsets
+
+# 2-simplices (0, 1, 2) and (1, 2, 3), and the edge 3 -> 4
+EDGES = [(0, 1), (0, 2), (1, 2), (1, 3), (2, 3), (3, 4)]
+CONTAINMENT = [[1, 2, 1],
+               [1, 3, 2],
+               [1, 3, 2],
+               [1, 3, 1],
+               [1, 1, 0]]
+
+
+@pytest.fixture
+def adj_matrix():
+    rows, cols = zip(*EDGES)
+    return sparse.csr_matrix((numpy.ones(len(EDGES), dtype=bool), (rows, cols)), shape=(5, 5))
+
+
+def _padded(counts, n_dims):
+    out = numpy.zeros((counts.shape[0], n_dims), dtype=counts.dtype)
+    out[:, :counts.shape[1]] = counts
+    return out
+
+
+def test_flagser_count(adj_matrix):
+    assert flagser_count(adj_matrix, threads=1).tolist() == CONTAINMENT
+    assert flagser_count(adj_matrix.toarray(), threads=2).tolist() == CONTAINMENT
+    assert flagser_count(adj_matrix, threads=1, max_dimension=1).tolist() == [_c[:2] for _c in CONTAINMENT]
+
+
+@pytest.mark.parametrize("subsets", [
+    [[0, 1, 2], [3, 4], [1, 2, 3, 4], [0, 1, 2, 3, 4]],
+    [[2, 0, 1], [], [4]],  # unsorted, empty
+    [[1, 2, 3], [0, 1]],  # fewer subsets than vertices, e.g. a slice of tribes
+])
+@pytest.mark.parametrize("threads", [1, 3])
+def test_flagser_count_subsets(adj_matrix, subsets, threads):
+    indptr = numpy.cumsum([0] + [len(_s) for _s in subsets])
+    indices = numpy.hstack([numpy.array(_s, dtype=int) for _s in subsets])
+    counts = flagser_count_subsets(adj_matrix, indptr, indices, threads=threads)
+    assert counts.shape[0] == len(indices)
+    for subset, a, b in zip(subsets, indptr[:-1], indptr[1:]):
+        if len(subset) == 0:
+            continue
+        expected = flagser_count(adj_matrix[subset][:, subset], threads=1)
+        assert numpy.array_equal(counts[a:b], _padded(expected, counts.shape[1]))
+
+
+def test_flagser_count_subsets_by_hand(adj_matrix):
+    counts = flagser_count_subsets(adj_matrix, [0, 3, 5, 9], [0, 1, 2, 3, 4, 1, 2, 3, 4], threads=1)
+    assert counts.tolist() == [[1, 2, 1], [1, 2, 1], [1, 2, 1],
+                               [1, 1, 0], [1, 1, 0],
+                               [1, 2, 1], [1, 2, 1], [1, 3, 1], [1, 1, 0]]
+    counts = flagser_count_subsets(adj_matrix, [0, 3], [0, 1, 2], threads=1, max_dimension=1)
+    assert counts.tolist() == [[1, 2], [1, 2], [1, 2]]
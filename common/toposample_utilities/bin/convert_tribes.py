@@ -0,0 +1,34 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from toposample.data import read_tribes_data, write_tribes
+
+
+def main(fn_in, fn_out):
+    write_tribes(read_tribes_data(fn_in), fn_out)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 3:
+        print("""
+        {0} -- converts the samples of neurons written by sample_tribes between the binary tribes store (.h5) and
+        .json. The format of each file is given by its extension.
+
+        Use:
+        {0} path/to/tribes.h5 path/to/tribes.json
+        or
+        {0} path/to/tribes.json path/to/tribes.h5
+        """.format(__file__))
+        sys.exit(2)
+    main(sys.argv[1], sys.argv[2])
@@ -0,0 +1,60 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+import pandas
+import pytest
+from scipy import sparse
+
+
+@pytest.fixture
+def adj_matrix():
+    """
+    Five neurons: a 3-cycle 0 -> 1 -> 2 -> 0, which connects to a chain 2 -> 3 -> 4
+    """
+    rows, cols = [0, 1, 2, 2, 3], [1, 2, 0, 3, 4]
+    return sparse.csr_matrix((numpy.ones(len(rows), dtype=bool), (rows, cols)), shape=(5, 5))
+
+
+@pytest.fixture
+def neuron_info():
+    return pandas.DataFrame({"x": [0.0, 1.0, 2.0, 3.0, 4.0]},
+                            index=pandas.Index([10, 20, 30, 40, 50], name="gid"))
+
+
+@pytest.fixture
+def tribes(adj_matrix, neuron_info):
+    from toposample.indexing import Tribes
+    return Tribes.from_adjacency(adj_matrix, neuron_info)
+
+
+# Members of the tribes of the neurons in adj_matrix, as local indices
+TRIBE_INDICES = [[0, 1, 2], [0, 1, 2], [0, 1, 2, 3], [2, 3, 4], [3, 4]]
+
+
+@pytest.fixture
+def database(tribes):
+    """
+    Topological database of the neurons in adj_matrix, with a column of each kind: numbers, strings and vectors of
+    numbers of varying length, including empty ones
+    """
+    db = pandas.DataFrame(index=pandas.Index(tribes.chief_gids, name="gid"))
+    db["tribe"] = tribes.to_series(index=db.index)
+    db["euler_char"] = [1, 1, 1, 1, 1]
+    db["mtype"] = ["L1_DAC", "L23_PC", "L23_PC", "L4_SS", "L5_TPC"]
+    db["bettis"] = pandas.Series([numpy.array([1, 0, 2]), numpy.array([1]), numpy.array([1, 3]), numpy.array([1]),
+                                  numpy.array([], dtype=int)], index=db.index)
+    db["spectrum"] = pandas.Series([numpy.array([-2.0, 0.0, 0.5]), numpy.array([3.0 + 1.0j, 1.0j]),
+                                    numpy.array([]), numpy.array([0.0]), numpy.array([-4.0, -1.0, 1.5, 1.5])],
+                                   index=db.index)
+    return db
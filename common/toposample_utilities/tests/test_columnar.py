@@ -0,0 +1,100 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+import pandas
+import pytest
+
+from toposample.db import (write_database, read_database, add_columns, ColumnarDatabase, is_columnar, read_tribes,
+                           read_index_and_columns)
+
+
+def _assert_same_column(a, b):
+    assert len(a) == len(b)
+    for u, v in zip(a, b):
+        assert numpy.array_equal(numpy.asarray(u), numpy.asarray(v))
+
+
+def test_is_columnar():
+    assert is_columnar("db.h5") and is_columnar("db.HDF5")
+    assert not is_columnar("db.pkl")
+
+
+@pytest.mark.parametrize("fn", ["db.h5", "db.pkl"])
+def test_round_trip(database, tmp_path, fn):
+    fn = str(tmp_path / fn)
+    write_database(database, fn)
+    DB = read_database(fn)
+    assert list(DB.columns) == list(database.columns)
+    assert DB.index.tolist() == database.index.tolist()
+    assert DB.index.name == "gid"
+    for col in database.columns:
+        _assert_same_column(DB[col], database[col])
+    index, columns = read_index_and_columns(fn)
+    assert index.tolist() == database.index.tolist() and columns == list(database.columns)
+
+
+def test_ragged(database, tmp_path):
+    fn = str(tmp_path / "db.h5")
+    write_database(database, fn)
+    db = ColumnarDatabase(fn)
+    assert db.kinds == {"tribe": "ragged", "euler_char": "scalar", "mtype": "string", "bettis": "ragged",
+                        "spectrum": "ragged"}
+    values, offsets = db.ragged("bettis")
+    assert values.tolist() == [1, 0, 2, 1, 1, 3, 1]
+    assert offsets.tolist() == [0, 3, 4, 6, 7, 7]
+    values, offsets = db.ragged("spectrum")
+    # Real vectors are stored together with the complex ones, in a common type
+    assert values.dtype == numpy.complex128
+    assert offsets.tolist() == [0, 3, 5, 5, 6, 10]
+    with pytest.raises(AssertionError):
+        db.ragged("euler_char")
+
+
+def test_read_columns(database, tmp_path):
+    fn = str(tmp_path / "db.h5")
+    write_database(database, fn)
+    DB = read_database(fn, columns=["mtype", "bettis"])
+    assert list(DB.columns) == ["mtype", "bettis"]
+    assert DB["mtype"].tolist() == database["mtype"].tolist()
+
+
+@pytest.mark.parametrize("fn", ["db.h5", "db.pkl"])
+def test_add_columns(database, tmp_path, fn):
+    fn = str(tmp_path / fn)
+    write_database(database, fn)
+    add_columns(fn, {"euler_char": [2, 2, 2, 2, 2],
+                     "new": pandas.Series([[1.0], [], [2.0, 3.0], [], []], dtype=object)})
+    DB = read_database(fn)
+    assert list(DB.columns) == list(database.columns) + ["new"]
+    assert DB["euler_char"].tolist() == [2, 2, 2, 2, 2]
+    _assert_same_column(DB["new"], [[1.0], [], [2.0, 3.0], [], []])
+    _assert_same_column(DB["bettis"], database["bettis"])
+
+
+@pytest.mark.parametrize("fn", ["db.h5", "db.pkl"])
+def test_add_column_of_wrong_length(database, tmp_path, fn):
+    fn = str(tmp_path / fn)
+    write_database(database, fn)
+    with pytest.raises(AssertionError):
+        add_columns(fn, {"new": [1, 2, 3]})
+
+
+@pytest.mark.parametrize("fn", ["db.h5", "db.pkl"])
+def test_read_tribes(database, tribes, tmp_path, fn):
+    fn = str(tmp_path / fn)
+    write_database(database, fn)
+    read = read_tribes(fn)
+    assert read.indptr.tolist() == tribes.indptr.tolist()
+    assert read.indices.tolist() == tribes.indices.tolist()
+    assert read.population_gids.tolist() == [10, 20, 30, 40, 50]
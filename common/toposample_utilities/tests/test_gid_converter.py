@@ -0,0 +1,74 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+import pandas
+import pytest
+
+from toposample.indexing import GidConverter
+
+
+def _converter(gids):
+    return GidConverter(pandas.DataFrame({"x": numpy.arange(len(gids))}, index=pandas.Index(gids, name="gid")))
+
+
+@pytest.mark.parametrize("gids", [
+    [100, 101, 102, 103],  # contiguous
+    [7, 3, 5, 4, 10],  # dense lookup table
+    [10, 20, 30, 40, 50],  # binary search
+    [900000, 2, 45],  # binary search, unsorted
+])
+def test_indices(gids):
+    conv = _converter(gids)
+    query = gids[::-1] + gids[:2]
+    expected = [gids.index(_g) for _g in query]
+    assert conv.indices(query).tolist() == expected
+    assert conv.indices(numpy.array(query, dtype=numpy.uint32)).tolist() == expected
+    assert conv.indices(numpy.array(query, dtype=float)).tolist() == expected
+    assert conv.indices(numpy.array([query, query])).tolist() == [expected, expected]
+    assert conv.index(gids[2]) == 2
+    assert conv.gids(expected).tolist() == query
+
+
+@pytest.mark.parametrize("gids", [[100, 101, 102, 103], [7, 3, 5, 4, 10], [10, 20, 30, 40, 50]])
+def test_unknown_gids(gids):
+    conv = _converter(gids)
+    for unknown in [0, 6, 11, 104, -1, 10 ** 12]:
+        if unknown in gids:
+            continue
+        with pytest.raises(KeyError):
+            conv.indices([gids[0], unknown])
+        with pytest.raises(KeyError):
+            conv.index(unknown)
+    with pytest.raises(KeyError):
+        conv.indices([gids[0] + 0.5])
+
+
+def test_empty():
+    conv = _converter([10, 20, 30])
+    assert conv.indices([]).tolist() == []
+    assert conv.indices(numpy.zeros((0, 2), dtype=int)).shape == (0, 2)
+
+
+def test_non_integer_gids():
+    conv = _converter(["a", "c", "b"])
+    assert conv.indices(["b", "a"]).tolist() == [2, 0]
+    with pytest.raises(KeyError):
+        conv.indices(["d"])
+
+
+def test_neuron_info(neuron_info):
+    conv = GidConverter(neuron_info)
+    assert conv.indices([50, 10, 30]).tolist() == [4, 0, 2]
+    with pytest.raises(KeyError):
+        conv.indices([25])
@@ -0,0 +1,88 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+import pytest
+
+from toposample.db import lookup_functions, ReducedColumns, ColumnarDatabase, write_database, top_n
+from toposample.db import get_entry_from_row
+
+RAGGED = [
+    [[3, 0, 1], [], [0, 0], [5], [2, 7, 7, -1]],
+    [[0.5, -2.0, 0.0], [1.5, 1.5], [], [-3.0], [0.0, 4.0, -4.0]],
+    [[1.0 + 1.0j, -2.0j], [], [0.0], [3.0 - 1.0j, 3.0 + 1.0j, 3.0]],
+]
+
+
+def _values_and_offsets(vectors):
+    offsets = numpy.hstack([0, numpy.cumsum([len(_v) for _v in vectors])]).astype(numpy.int64)
+    return numpy.hstack([numpy.array(_v) for _v in vectors if len(_v) > 0]), offsets
+
+
+@pytest.mark.parametrize("vectors", RAGGED)
+@pytest.mark.parametrize("function", sorted(lookup_functions.ragged_functions.keys()))
+def test_ragged_functions(vectors, function):
+    values, offsets = _values_and_offsets(vectors)
+    expected = [lookup_functions.__dict__[function](numpy.array(_v, dtype=values.dtype)) for _v in vectors]
+    assert numpy.allclose(lookup_functions.ragged_functions[function](values, offsets), expected)
+
+
+def test_ragged_functions_by_hand():
+    values, offsets = _values_and_offsets(RAGGED[0])
+    assert lookup_functions.ragged_functions["smallest_nonzero_value"](values, offsets).tolist() == [1, 0, 0, 5, -1]
+    assert lookup_functions.ragged_functions["largest_absolute_value"](values, offsets).tolist() == [3, 0, 0, 5, 7]
+    assert lookup_functions.ragged_functions["difference_between_largest_values"](values, offsets).tolist() == \
+        [2.0, 0.0, 0.0, 0.0, 0.0]
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_reduced_columns(database, tmp_path, columnar):
+    db = database
+    if columnar:
+        write_database(database, str(tmp_path / "db.h5"))
+        db = ColumnarDatabase(str(tmp_path / "db.h5"))
+    reduced = ReducedColumns(db)
+    assert reduced.get("bettis", index=0).tolist() == [1, 1, 1, 1, 0]
+    assert reduced.get("bettis", index=2).tolist() == [2, 0, 0, 0, 0]
+    assert reduced.get("euler_char").tolist() == [1, 1, 1, 1, 1]
+    assert reduced.get("mtype").tolist() == database["mtype"].tolist()
+    assert reduced.lengths("spectrum").tolist() == [3, 2, 0, 1, 4]
+    assert reduced.entry("spectrum", 1).tolist() == [3.0 + 1.0j, 1.0j]
+    for column in ["bettis", "spectrum"]:
+        for index, function in [(None, "largest_absolute_value"), (None, "smallest_nonzero_value"),
+                                (None, "difference_between_largest_values"), (1, None)]:
+            expected = [get_entry_from_row(_row, column, index=index, function=function)
+                        for _, _row in database.iterrows()]
+            assert numpy.allclose(reduced.get(column, index=index, function=function), expected)
+    # Cached
+    assert reduced.get("bettis", function="largest_value") is reduced.get("bettis", function="largest_value")
+    assert reduced.get_series("bettis", index=0).index.tolist() == [10, 20, 30, 40, 50]
+
+
+@pytest.mark.parametrize("values, N, expected", [
+    ([3, 1, 3, 2, 3], 2, [2, 4]),  # of equal values, the later ones are picked and come last
+    ([3, 1, 3, 2, 3], 4, [3, 0, 2, 4]),
+    ([1.0, numpy.nan, 2.0], 2, [2, 1]),
+    ([2, 1], 5, [1, 0]),
+    ([2, 1], 0, []),
+    ([], 3, []),
+])
+def test_top_n(values, N, expected):
+    assert top_n(numpy.array(values), N).tolist() == expected
+
+
+@pytest.mark.parametrize("dtype", [int, float, complex])
+def test_top_n_as_argsort(dtype):
+    values = numpy.random.RandomState(0).randint(0, 5, size=50).astype(dtype)
+    for N in [1, 7, 10, 49, 50]:
+        assert top_n(values, N).tolist() == numpy.argsort(values, kind="stable")[-N:].tolist()
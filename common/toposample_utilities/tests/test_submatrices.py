@@ -0,0 +1,48 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+
+from toposample.indexing import GidConverter, tribal_submatrices
+
+from conftest import TRIBE_INDICES
+
+
+def test_submatrix_of_tribe(tribes, adj_matrix):
+    # Tribe of neuron 2: the 3-cycle and neuron 3
+    expected = [[0, 1, 0, 0],
+                [0, 0, 1, 0],
+                [1, 0, 0, 1],
+                [0, 0, 0, 0]]
+    assert tribes.submatrices(adj_matrix)[2].toarray().astype(int).tolist() == expected
+
+
+def test_same_as_slicing(tribes, adj_matrix):
+    submats = tribes.submatrices(adj_matrix)
+    assert len(submats) == 5
+    for members, submat in zip(TRIBE_INDICES, submats):
+        assert numpy.array_equal(submat.toarray(), adj_matrix[numpy.ix_(members, members)].toarray())
+    assert submats.edge_counts.tolist() == [3, 3, 4, 2, 1]
+
+
+def test_cached_per_matrix(tribes, adj_matrix):
+    assert tribes.submatrices(adj_matrix) is tribes.submatrices(adj_matrix)
+    other = adj_matrix.copy()
+    assert tribes.submatrices(other) is not tribes.submatrices(adj_matrix)
+
+
+def test_lists_of_gids(tribes, adj_matrix, neuron_info):
+    conv = GidConverter(neuron_info)
+    from_lists = list(tribal_submatrices([_t.tolist() for _t in tribes], adj_matrix, conv))
+    for a, b in zip(from_lists, tribal_submatrices(tribes, adj_matrix, conv)):
+        assert numpy.array_equal(a.toarray(), b.toarray())
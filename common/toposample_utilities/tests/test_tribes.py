@@ -0,0 +1,78 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+import pytest
+
+from toposample.indexing import Tribes, tribal_chiefs
+
+from conftest import TRIBE_INDICES
+
+
+def test_from_adjacency(tribes):
+    assert len(tribes) == 5
+    assert tribes.indptr.tolist() == [0, 3, 6, 10, 13, 15]
+    for i, expected in enumerate(TRIBE_INDICES):
+        assert tribes.local_indices(i).tolist() == expected
+        assert tribes[i].tolist() == [10 * (_j + 1) for _j in expected]
+    assert tribes[-1].tolist() == [40, 50]
+    assert tribes.chief_gids.tolist() == [10, 20, 30, 40, 50]
+    assert tribes.sizes.tolist() == [3, 3, 4, 3, 2]
+
+
+def test_iteration(tribes):
+    assert [_t.tolist() for _t in tribes] == [[10 * (_j + 1) for _j in _t] for _t in TRIBE_INDICES]
+
+
+def test_slice(tribes):
+    sub = tribes[2:4]
+    assert isinstance(sub, Tribes)
+    assert sub.indptr.tolist() == [0, 4, 7]
+    assert sub.chiefs.tolist() == [2, 3]
+    assert [_t.tolist() for _t in sub] == [[10, 20, 30, 40], [30, 40, 50]]
+    assert len(tribes[4:2]) == 0
+    with pytest.raises(AssertionError):
+        tribes[::2]
+
+
+def test_to_series(tribes):
+    series = tribes.to_series()
+    assert series.index.tolist() == [10, 20, 30, 40, 50]
+    assert series[40].tolist() == [30, 40, 50]
+
+
+def test_membership_matrix(tribes):
+    expected = numpy.zeros((5, 5), dtype=int)
+    for i, members in enumerate(TRIBE_INDICES):
+        expected[i, members] = 1
+    assert numpy.array_equal(tribes.membership_matrix().toarray(), expected)
+
+
+def test_tribal_chiefs(tribes):
+    assert tribal_chiefs(tribes[3:5]).tolist() == [3, 4]
+    # Lists of gids are assumed to be in the order of the adjacency matrix
+    assert tribal_chiefs([[10, 20], [20]]).tolist() == [0, 1]
+
+
+def test_from_gid_lists(tribes, neuron_info):
+    from_lists = Tribes.from_gid_lists(tribes.to_series().values, neuron_info.index)
+    assert from_lists.indptr.tolist() == tribes.indptr.tolist()
+    assert from_lists.indices.tolist() == tribes.indices.tolist()
+    assert from_lists.chief_gids.tolist() == [10, 20, 30, 40, 50]
+    # Members keep the given order; empty tribes are allowed
+    from_lists = Tribes.from_gid_lists([[50, 10], [], [30]], neuron_info.index)
+    assert from_lists.indptr.tolist() == [0, 2, 2, 3]
+    assert from_lists.indices.tolist() == [4, 0, 2]
+    assert [_t.tolist() for _t in from_lists] == [[50, 10], [], [30]]
+    with pytest.raises(KeyError):
+        Tribes.from_gid_lists([[10, 15]], neuron_info.index)
@@ -0,0 +1,98 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+
+import numpy
+import pytest
+
+from toposample.data import TribesStore, write_tribes, update_tribes, read_tribes_data, export_json, is_tribes_store
+
+
+@pytest.fixture
+def samples(tribes):
+    """Samples as written by sample_tribes: the tribes of two chiefs, a volumetric sample, an empty sample and an
+    empty specifier"""
+    return {
+        "Champions": {
+            "Euler characteristic": dict([(str(i), {"gids": tribes[chief].tolist(),
+                                                    "chief": int(tribes.chief_gids[chief])})
+                                          for i, chief in enumerate([2, 4])]),
+            "tribe_size": {}
+        },
+        "Radius": {
+            "Radius": {"0": {"gids": [20, 30, 40], "center_offset": [0.5, -1.0, 0.0]},
+                       "1": {"gids": [], "center_offset": [0.0, 0.0, 0.0]}}
+        }
+    }
+
+
+def test_is_tribes_store():
+    assert is_tribes_store("tribes.h5") and is_tribes_store("tribes.HDF5")
+    assert not is_tribes_store("tribes.json")
+
+
+@pytest.mark.parametrize("fn", ["tribes.h5", "tribes.json"])
+def test_round_trip(samples, tmp_path, fn):
+    fn = str(tmp_path / fn)
+    write_tribes(samples, fn)
+    assert read_tribes_data(fn) == samples
+    assert [_p.name for _p in tmp_path.iterdir()] == [tmp_path.joinpath(fn).name]
+
+
+def test_store(samples, tmp_path):
+    fn = str(tmp_path / "tribes.h5")
+    write_tribes(samples, fn)
+    store = TribesStore(fn)
+    assert len(store) == 4
+    assert store.conditions == [("Champions", "Euler characteristic", "0"), ("Champions", "Euler characteristic", "1"),
+                                ("Radius", "Radius", "0"), ("Radius", "Radius", "1")]
+    assert store.offsets.tolist() == [0, 4, 6, 9, 9]
+    assert store.all_gids.tolist() == [10, 20, 30, 40, 40, 50, 20, 30, 40]
+    assert store.gids(1).tolist() == [40, 50]
+    assert len(store.gids(3)) == 0
+    assert store.fields["chief"] == {0: 30, 1: 50}
+    assert store.entry(0) == {"gids": [10, 20, 30, 40], "chief": 30}
+    assert store.entry(2) == {"gids": [20, 30, 40], "center_offset": [0.5, -1.0, 0.0]}
+    assert store.to_dict() == samples
+
+
+def test_not_a_store(tmp_path):
+    import h5py
+    fn = str(tmp_path / "other.h5")
+    with h5py.File(fn, "w") as h5:
+        h5.create_dataset("gids", data=numpy.arange(3))
+    with pytest.raises(AssertionError):
+        TribesStore(fn)
+
+
+@pytest.mark.parametrize("fn", ["tribes.h5", "tribes.json"])
+def test_update_tribes(samples, tmp_path, fn):
+    fn = str(tmp_path / fn)
+    update_tribes({"Radius": samples["Radius"]}, fn)
+    assert read_tribes_data(fn) == {"Radius": samples["Radius"]}
+    update_tribes({"Champions": samples["Champions"]}, fn)
+    assert read_tribes_data(fn) == samples
+    # Samplings are replaced entirely
+    update_tribes({"Radius": {"Radius": {"0": {"gids": [50]}}}}, fn)
+    data = read_tribes_data(fn)
+    assert data["Radius"] == {"Radius": {"0": {"gids": [50]}}}
+    assert data["Champions"] == samples["Champions"]
+
+
+def test_export_json(samples, tmp_path):
+    fn = str(tmp_path / "tribes.h5")
+    write_tribes(samples, fn)
+    export_json(fn, str(tmp_path / "tribes.json"))
+    with open(str(tmp_path / "tribes.json"), "r") as fid:
+        assert json.load(fid) == samples
@@ -13,3 +13,4 @@ You should have received a copy of the GNU Affero General Public License along w
 
 from .read_data_json import TopoData
 from .read_data_json import read_h5_dataset, read_multiple_h5_datasets
+from .tribes_store import TribesStore, write_tribes, update_tribes, read_tribes_data, export_json, is_tribes_store
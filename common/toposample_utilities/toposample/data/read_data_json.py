@@ -15,6 +15,7 @@ import os
 import json
 
 from .data_structures import ConditionCollection, ResultsWithConditions
+from .tribes_store import TribesStore, is_tribes_store
 
 
 class TopoData(object):
@@ -44,6 +45,12 @@ class TopoData(object):
             ...,
             "working_dir/data/other/manifold_analysis/random/Euler characteristic/20/results.h5"]
 
+    Samples of neurons written by sample_tribes into a binary tribes store (.h5, see toposample.data.write_tribes) are
+    read the same way. Only the table of samples is read; the gids are memory mapped and a sample's gids are read when
+    its result is accessed:
+        tribes = TopoData("working_dir/data/analyzed_data/tribes.h5")
+        tribes["gids"].get(sampling="Champions", specifier="Euler characteristic", index="0")
+
     In some cases (such as the examples above), the result is merely a path pointing to the file holding the actual
     results. In that case you can use the 'follow_link_functions' argument when instantiating the TopoData object
     to specify the function to be used to read the actual data from the file.
@@ -64,12 +71,16 @@ class TopoData(object):
     """
     def __init__(self, fn, follow_link_functions={}):
         self._fn = fn
-        with open(fn, "r") as fid:
-            self._raw = json.load(fid)
         #  Make it so the follow_link_functions interpret local paths as being relative to the file being read here.
         for k, v in follow_link_functions.items():
             follow_link_functions[k] = self.resolve_local_path(v)
-        self.data = self.parse_raw(follow_link_functions)
+        if is_tribes_store(fn):
+            self._raw = None
+            self.data = self.parse_store(TribesStore(fn), follow_link_functions)
+        else:
+            with open(fn, "r") as fid:
+                self._raw = json.load(fid)
+            self.data = self.parse_raw(follow_link_functions)
 
     def parse_raw(self, follow_link_functions):
         out_dict = {}
@@ -85,6 +96,20 @@ class TopoData(object):
         out_dict = dict([(k, ConditionCollection(v)) for k, v in out_dict.items()])
         return out_dict
 
+    @staticmethod
+    def parse_store(store, follow_link_functions):
+        out_dict = {}
+        for i, (sampling, specifier, index) in enumerate(store.conditions):
+            conds = {"sampling": sampling, "specifier": specifier, "index": index}
+            # Not kept in memory: each access returns a view into the memory mapped gids
+            out_dict.setdefault("gids", []).append(ResultsWithConditions(i, store.gids, False, **conds))
+            for k, v in store.fields.items():
+                if i in v:
+                    out_dict.setdefault(k, []).append(ResultsWithConditions(v[i], *follow_link_functions.get(k, []),
+                                                                            **conds))
+        out_dict = dict([(k, ConditionCollection(v)) for k, v in out_dict.items()])
+        return out_dict
+
     def __getitem__(self, spec_key):
         return self.data[spec_key]
 
@@ -0,0 +1,181 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+import numpy
+
+FORMAT_NAME = "toposample_tribes_store"
+STORE_EXTENSIONS = (".h5", ".hdf5")
+
+
+def is_tribes_store(fn):
+    """Whether a file of samples (as written by sample_tribes) is a binary tribes store or .json, judged by its extension"""
+    return os.path.splitext(fn)[1].lower() in STORE_EXTENSIONS
+
+
+def _entries(data):
+    for sampling, samp_lvl in data.items():
+        for specifier, spec_lvl in samp_lvl.items():
+            for index, idx_lvl in spec_lvl.items():
+                yield sampling, specifier, index, idx_lvl
+
+
+def _write_store(data, fn):
+    import h5py
+    conditions = {"sampling": [], "specifier": [], "index": []}
+    fields = {}
+    gids = []
+    for i, (sampling, specifier, index, entry) in enumerate(_entries(data)):
+        conditions["sampling"].append(sampling)
+        conditions["specifier"].append(specifier)
+        conditions["index"].append(index)
+        gids.append(numpy.asarray(entry.get("gids", []), dtype=numpy.int64))
+        for k, v in entry.items():
+            if k != "gids":
+                fields.setdefault(k, {})[str(i)] = v
+    offsets = numpy.hstack([0, numpy.cumsum([len(_g) for _g in gids])]).astype(numpy.int64)
+    with h5py.File(fn, "w") as h5:
+        h5.attrs["format"] = FORMAT_NAME
+        # Small table of everything but the gids
+        h5.attrs["fields"] = json.dumps(fields)
+        # Samplings and specifiers in their order, including those without any samples
+        h5.attrs["layout"] = json.dumps([[_smpl, list(_spec_lvl.keys())] for _smpl, _spec_lvl in data.items()])
+        for k, v in conditions.items():
+            h5.create_dataset(k, data=numpy.array(v, dtype=object), dtype=h5py.string_dtype())
+        h5.create_dataset("gids", data=numpy.concatenate([numpy.zeros(0, dtype=numpy.int64)] + gids))
+        h5.create_dataset("offsets", data=offsets)
+
+
+def write_tribes(data, fn):
+    """
+    Write samples of neurons, as generated by sample_tribes. If the file name ends in .h5 or .hdf5 they are written as
+    a binary tribes store, otherwise as .json. In the tribes store the gids of all samples are concatenated into a
+    single array ("gids"); the gids of sample i are gids[offsets[i]:offsets[i + 1]]. The sampling, specifier and index
+    of each sample and any other information (chief, center_offset, ...) are kept in a small table next to it.
+    The file is written to a temporary file first and then moved into place.
+    :param data: dict; samples by sampling, specifier and index. Each sample is a dict with at least "gids"
+    :param fn: str; path to write to
+    """
+    tmp_fn = fn + ".{0}.tmp".format(os.getpid())
+    if is_tribes_store(fn):
+        _write_store(data, tmp_fn)
+    else:
+        with open(tmp_fn, "w") as fid:
+            json.dump(data, fid, indent=2)
+    os.replace(tmp_fn, fn)
+
+
+def read_tribes_data(fn):
+    """
+    :param fn: str; path to a tribes store or .json file of samples
+    :return: dict; all samples by sampling, specifier and index, as written by write_tribes. Everything is read
+    """
+    if not is_tribes_store(fn):
+        with open(fn, "r") as fid:
+            return json.load(fid)
+    return TribesStore(fn).to_dict()
+
+
+def update_tribes(data, fn):
+    """
+    Add samples to an existing file of samples, replacing any with the same sampling, or create it
+    :param data: dict; samples by sampling, specifier and index
+    :param fn: str; path to a tribes store or .json file
+    """
+    existing = read_tribes_data(fn) if os.path.exists(fn) else {}
+    existing.update(data)
+    write_tribes(existing, fn)
+
+
+def export_json(fn, json_fn):
+    """
+    Export a tribes store to .json, in the same format as written by sample_tribes into a .json file
+    :param fn: str; path to the tribes store
+    :param json_fn: str; path of the .json file to write
+    """
+    write_tribes(read_tribes_data(fn), json_fn)
+
+
+class TribesStore(object):
+    """
+    TRIBESSTORE:
+    Read access to samples of neurons in a binary tribes store (see write_tribes). Only the table of samples is read on
+    construction; the gids are memory mapped when first accessed and sample i is a view into them:
+        store = TribesStore("tribes.h5")
+        len(store)
+            3075
+        store.conditions[0]
+            ('Champions', 'Euler characteristic', '0')
+        store.gids(0)
+            array([  1001,   1002, ..., 31234])
+        store.fields["chief"][0]
+            1002
+    """
+    def __init__(self, fn):
+        import h5py
+        self.fn = fn
+        with h5py.File(fn, "r") as h5:
+            assert h5.attrs.get("format", None) == FORMAT_NAME, "{0} is not a tribes store!".format(fn)
+            self.conditions = list(zip(*[h5[_k].asstr()[()].tolist() for _k in ["sampling", "specifier", "index"]]))
+            self.offsets = h5["offsets"][()]
+            fields = json.loads(h5.attrs["fields"])
+            self._layout = json.loads(h5.attrs["layout"])
+        # For each field a dict of the samples that have it
+        self.fields = dict([(k, dict([(int(_i), _v) for _i, _v in v.items()])) for k, v in fields.items()])
+        self._gids = None
+
+    def __len__(self):
+        return len(self.conditions)
+
+    @property
+    def all_gids(self):
+        """The gids of all samples, concatenated. Memory mapped"""
+        if self._gids is None:
+            import h5py
+            with h5py.File(self.fn, "r") as h5:
+                dset = h5["gids"]
+                offset = dset.id.get_offset()
+                if dset.chunks is not None or offset is None or dset.size == 0:
+                    self._gids = dset[()]
+                else:
+                    self._gids = numpy.asarray(numpy.memmap(self.fn, mode="r", dtype=dset.dtype, shape=dset.shape,
+                                                            offset=offset))
+        return self._gids
+
+    def gids(self, i):
+        """
+        :param i: int; index of a sample
+        :return: numpy.array (view); gids of the neurons in sample i
+        """
+        return self.all_gids[self.offsets[i]:self.offsets[i + 1]]
+
+    def entry(self, i):
+        """
+        :param i: int; index of a sample
+        :return: dict; sample i, as in the .json format
+        """
+        out = {"gids": self.gids(i).tolist()}
+        for k, v in self.fields.items():
+            if i in v:
+                out[k] = v[i]
+        return out
+
+    def to_dict(self):
+        """
+        :return: dict; all samples by sampling, specifier and index, as in the .json format
+        """
+        out_dict = dict([(_smpl, dict([(_spec, {}) for _spec in _specs])) for _smpl, _specs in self._layout])
+        for i, (sampling, specifier, index) in enumerate(self.conditions):
+            out_dict.setdefault(sampling, {}).setdefault(specifier, {})[index] = self.entry(i)
+        return out_dict
@@ -12,6 +12,9 @@ You should have received a copy of the GNU Affero General Public License along w
 """
 
 from toposample.db import lookup_functions
+from .columnar import read_database, write_database, add_columns, ColumnarDatabase, is_columnar
+from .columnar import read_manifest, write_manifest, read_index_and_columns, remove_database, read_tribes
+from .reduced import ReducedColumns, top_n
 
 
 '''This file provides some functionality to interact with the "topological database file" that is generated in the
@@ -43,10 +46,5 @@ def get_entry_from_database(db, row_index, column_name, index=None, function=Non
 
 
 def get_column_from_database(db, column_name, index=None, function=None):
-    column = db[column_name].values
-    if index is not None:
-        column = [_x[index] if len(_x) > index else 0 for _x in column]
-    if function is not None:
-        function = lookup_functions.__dict__[function]
-        column = [function(_x) for _x in column]
-    return column
+    # To look up several columns of the same database, use a single ReducedColumns, which caches them
+    return ReducedColumns(db).get(column_name, index=index, function=function)
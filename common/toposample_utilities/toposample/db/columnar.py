@@ -0,0 +1,300 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+import numpy
+import pandas
+
+FORMAT_NAME = "toposample_columnar_database"
+COLUMNAR_EXTENSIONS = (".h5", ".hdf5")
+
+
+def is_columnar(fn):
+    """Whether a database file is in the columnar format or a pickled pandas.DataFrame, judged by its extension"""
+    return os.path.splitext(fn)[1].lower() in COLUMNAR_EXTENSIONS
+
+
+def _encode_column(column):
+    """
+    :param column: pandas.Series or list; one entry per row. Entries can be numbers, strings or vectors of numbers
+    :return: tuple; kind of the column ("scalar", "string" or "ragged") and dict of arrays to store
+    """
+    if not isinstance(column, pandas.Series):
+        column = pandas.Series(list(column), dtype=object)
+    if pandas.api.types.is_numeric_dtype(column.dtype) or pandas.api.types.is_bool_dtype(column.dtype):
+        return "scalar", {"values": numpy.asarray(column.values)}
+    entries = column.tolist()
+    if all([isinstance(_v, str) for _v in entries]):
+        return "string", {"values": numpy.array(entries, dtype=object)}
+    if all([numpy.ndim(_v) == 0 for _v in entries]):
+        return "scalar", {"values": numpy.array(entries)}
+    entries = [numpy.asarray(_v) for _v in entries]
+    assert all([_v.ndim == 1 for _v in entries]), "Entries must be scalars, strings or one-dimensional vectors!"
+    non_empty = [_v.dtype for _v in entries if len(_v) > 0]
+    dtype = numpy.result_type(*non_empty) if len(non_empty) > 0 else numpy.float64
+    offsets = numpy.hstack([0, numpy.cumsum([len(_v) for _v in entries])]).astype(numpy.int64)
+    values = numpy.concatenate([numpy.zeros(0, dtype=dtype)] + entries).astype(dtype, copy=False)
+    return "ragged", {"values": values, "offsets": offsets}
+
+
+def _write_column(h5, name, column):
+    import h5py
+    assert "/" not in name, "Column names must not contain '/'!"
+    n_rows = h5["index"].shape[0]
+    assert len(column) == n_rows, "Column {0} has {1} entries, but the database {2} rows!".format(name, len(column),
+                                                                                                  n_rows)
+    if isinstance(column, pandas.Series) and not isinstance(column.index, pandas.RangeIndex):
+        assert numpy.array_equal(column.index.values, h5["index"][()]), "Index of column {0} does not match!".format(name)
+    kind, arrays = _encode_column(column)
+    columns = json.loads(h5.attrs["columns"])
+    if name in h5["columns"]:
+        del h5["columns"][name]
+    else:
+        columns.append(name)
+    grp = h5["columns"].create_group(name)
+    grp.attrs["kind"] = kind
+    for k, v in arrays.items():
+        if v.dtype == object:
+            grp.create_dataset(k, data=v, dtype=h5py.string_dtype())
+        else:
+            grp.create_dataset(k, data=v)
+    h5.attrs["columns"] = json.dumps(columns)
+
+
+def write_database(DB, fn):
+    """
+    Write a topological database. If the file name ends in .h5 or .hdf5 it is written in the columnar format, otherwise
+    the DataFrame is pickled.
+    In the columnar format each column is stored separately in an hdf5 file: Columns of numbers or strings as a single
+    array; columns of vectors (tribes, Betti numbers, spectra, ...) as the concatenation of all vectors ("values") and
+    the offsets of the individual vectors into it ("offsets"). Entry i is values[offsets[i]:offsets[i + 1]].
+    :param DB: pandas.DataFrame
+    :param fn: str; path to write to
+    """
+    if not is_columnar(fn):
+        DB.to_pickle(fn)
+        return
+    import h5py
+    with h5py.File(fn, "w") as h5:
+        h5.attrs["format"] = FORMAT_NAME
+        h5.attrs["columns"] = json.dumps([])
+        h5.create_dataset("index", data=DB.index.values)
+        if DB.index.name is not None:
+            h5["index"].attrs["name"] = DB.index.name
+        h5.create_group("columns")
+        for col in DB.columns:
+            _write_column(h5, col, DB[col])
+
+
+def add_columns(fn, columns):
+    """
+    Add columns to an existing topological database, or replace them. In the columnar format only the new columns are
+    written, otherwise the entire DataFrame is read and written again.
+    :param fn: str; path to the database
+    :param columns: dict or pandas.DataFrame; the new columns, by name, each with one entry per row of the database
+    """
+    if not is_columnar(fn):
+        DB = pandas.read_pickle(fn)
+        for name in columns:
+            column = columns[name]
+            assert len(column) == len(DB), "Column {0} has {1} entries, but the database {2} rows!".format(
+                name, len(column), len(DB))
+            if isinstance(column, pandas.Series) and not isinstance(column.index, pandas.RangeIndex):
+                assert numpy.array_equal(column.index.values, DB.index.values), \
+                    "Index of column {0} does not match!".format(name)
+            # By position, as in the columnar format
+            DB[name] = pandas.Series(list(column), index=DB.index)
+        DB.to_pickle(fn)
+        return
+    import h5py
+    with h5py.File(fn, "r+") as h5:
+        for name in columns:
+            _write_column(h5, name, columns[name])
+
+
+def _manifest_file(fn):
+    return fn + ".manifest.json"
+
+
+def read_manifest(fn):
+    """
+    Read the manifest of a topological database, i.e. the provenance of its columns, as written by gen_topo_db. In the
+    columnar format it is stored in the database file itself, otherwise next to it, in <fn>.manifest.json.
+    :param fn: str; path to the database
+    :return: dict; empty if the database has no manifest
+    """
+    if not is_columnar(fn):
+        if not os.path.isfile(_manifest_file(fn)):
+            return {}
+        with open(_manifest_file(fn), "r") as fid:
+            return json.load(fid)
+    import h5py
+    with h5py.File(fn, "r") as h5:
+        return json.loads(h5.attrs.get("manifest", "{}"))
+
+
+def write_manifest(fn, manifest):
+    """
+    :param fn: str; path to an existing database
+    :param manifest: dict; json serializable. Replaces the existing manifest
+    """
+    if not is_columnar(fn):
+        with open(_manifest_file(fn), "w") as fid:
+            json.dump(manifest, fid, indent=2)
+        return
+    import h5py
+    with h5py.File(fn, "r+") as h5:
+        h5.attrs["manifest"] = json.dumps(manifest)
+
+
+def remove_database(fn):
+    """
+    Delete a topological database, together with its manifest if that is stored separately
+    :param fn: str; path to the database
+    """
+    os.remove(fn)
+    if os.path.isfile(_manifest_file(fn)):
+        os.remove(_manifest_file(fn))
+
+
+def read_index_and_columns(fn):
+    """
+    :param fn: str; path to the database
+    :return: tuple; the index of the database (pandas.Index) and the names of its columns (list). In the columnar
+    format, no column is read.
+    """
+    if not is_columnar(fn):
+        DB = pandas.read_pickle(fn)
+        return DB.index, list(DB.columns)
+    db = ColumnarDatabase(fn)
+    return db.index, list(db.columns)
+
+
+class ColumnarDatabase(object):
+    """
+    COLUMNARDATABASE:
+    Read access to a topological database in the columnar format (see write_database). Only the index and the names of
+    the columns are read on construction; a column is read when it is accessed:
+        db = ColumnarDatabase("community_database.h5")
+        db.columns
+            ['tribe', 'x', 'y', 'z', 'layer', 'mtype', 'euler_char', ...]
+        db["euler_char"]
+            pandas.Series
+        values, offsets = db.ragged("bettis")
+        tribes = db.tribes()
+            toposample.indexing.Tribes
+
+    Large numerical arrays are memory mapped instead of read, such that only the parts that are used are loaded.
+    """
+    def __init__(self, fn):
+        import h5py
+        self.fn = fn
+        with h5py.File(fn, "r") as h5:
+            assert h5.attrs.get("format", None) == FORMAT_NAME, "{0} is not a columnar topological database!".format(fn)
+            self.index = pandas.Index(h5["index"][()], name=h5["index"].attrs.get("name", None))
+            self.columns = json.loads(h5.attrs["columns"])
+            self.kinds = dict([(_col, h5["columns"][_col].attrs["kind"]) for _col in self.columns])
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, column):
+        return column in self.kinds
+
+    def _read_array(self, h5, path):
+        dset = h5[path]
+        if dset.dtype.kind == "O":
+            return dset.asstr()[()]
+        offset = dset.id.get_offset()
+        if dset.chunks is not None or offset is None or dset.size == 0:
+            return dset[()]
+        return numpy.asarray(numpy.memmap(self.fn, mode="r", dtype=dset.dtype, shape=dset.shape, offset=offset))
+
+    def _read(self, column, name):
+        import h5py
+        assert column in self, "No column {0} in {1}".format(column, self.fn)
+        with h5py.File(self.fn, "r") as h5:
+            return self._read_array(h5, "columns/{0}/{1}".format(column, name))
+
+    def ragged(self, column):
+        """
+        :param column: str; name of a column of vectors
+        :return: tuple of numpy.arrays (memory mapped); values and offsets of the column. Entry i of the column is
+        values[offsets[i]:offsets[i + 1]]
+        """
+        assert self.kinds.get(column, None) == "ragged", "{0} is not a column of vectors!".format(column)
+        return self._read(column, "values"), self._read(column, "offsets")
+
+    def __getitem__(self, column):
+        if self.kinds.get(column, None) != "ragged":
+            return pandas.Series(self._read(column, "values"), index=self.index, name=column)
+        values, offsets = self.ragged(column)
+        entries = numpy.empty(len(self), dtype=object)
+        for i, entry in enumerate(numpy.split(values, offsets[1:-1])):
+            entries[i] = entry
+        return pandas.Series(entries, index=self.index, name=column)
+
+    def to_frame(self, columns=None):
+        """
+        :param columns: list; names of the columns to read. Default: all
+        :return: pandas.DataFrame
+        """
+        if columns is None:
+            columns = self.columns
+        DB = pandas.DataFrame(index=self.index)
+        for col in columns:
+            DB[col] = self[col]
+        return DB
+
+    def tribes(self, column="tribe"):
+        """
+        :param column: str; name of the column holding the gids of the tribes
+        :return: toposample.indexing.Tribes; the tribes of all neurons, using the (memory mapped) offsets of the column
+        """
+        from ..indexing import Tribes
+        values, offsets = self.ragged(column)
+        indices = self.index.get_indexer(values)
+        assert numpy.all(indices >= 0), "Tribes contain gids that are not in the index!"
+        return Tribes(offsets, indices, self.index.values)
+
+
+def read_database(fn, columns=None):
+    """
+    Read a topological database, either in the columnar format or a pickled DataFrame (see write_database)
+    :param fn: str; path to the database
+    :param columns: list; names of the columns to read. Default: all. In the columnar format, other columns are not
+    touched at all.
+    :return: pandas.DataFrame
+    """
+    if not is_columnar(fn):
+        DB = pandas.read_pickle(fn)
+        if columns is not None:
+            DB = DB[list(columns)]
+        return DB
+    return ColumnarDatabase(fn).to_frame(columns)
+
+
+def read_tribes(fn, column="tribe"):
+    """
+    Read the tribes stored in a topological database
+    :param fn: str; path to the database
+    :param column: str; name of the column holding the gids of the tribes
+    :return: toposample.indexing.Tribes; tribe i is the one in row i of the database. Its population_gids are the index
+    of the database.
+    """
+    if is_columnar(fn):
+        return ColumnarDatabase(fn).tribes(column=column)
+    from ..indexing import Tribes
+    DB = read_database(fn, columns=[column])
+    return Tribes.from_gid_lists(DB[column], DB.index)
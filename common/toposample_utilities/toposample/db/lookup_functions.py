@@ -51,3 +51,67 @@ def largest_absolute_value(v):
 
 def nanmean(v):
     return numpy.nanmean(v)
+
+
+# Vectorized versions of the functions above, applied to all entries of a column of vectors at once. The column is given
+# as the concatenation of all vectors (values) and their offsets into it; vector i is values[offsets[i]:offsets[i + 1]].
+# They return the same as applying the function to each vector.
+
+def _segment_reduce(ufunc, values, offsets, empty):
+    lengths = numpy.diff(offsets)
+    out = numpy.full(len(lengths), empty, dtype=values.dtype)
+    non_empty = lengths > 0
+    if numpy.any(non_empty):
+        out[non_empty] = ufunc.reduceat(values, offsets[:-1][non_empty])
+    return out
+
+
+def _ragged_smallest_nonzero_value(values, offsets):
+    # Zeros are replaced by a value that no other is larger than
+    fill = numpy.iinfo(values.dtype).max if values.dtype.kind in "iu" else numpy.inf
+    out = _segment_reduce(numpy.minimum, numpy.where(values != 0, values, fill).astype(values.dtype), offsets, 0)
+    has_nonzero = _segment_reduce(numpy.logical_or, values != 0, offsets, False)
+    out[~has_nonzero] = 0
+    return out
+
+
+def _ragged_smallest_nonzero_absolute_value(values, offsets):
+    return _ragged_smallest_nonzero_value(numpy.abs(values), offsets)
+
+
+def _ragged_largest_value(values, offsets):
+    return _segment_reduce(numpy.maximum, values, offsets, 0)
+
+
+def _ragged_largest_absolute_value(values, offsets):
+    return _ragged_largest_value(numpy.abs(values), offsets)
+
+
+def _ragged_difference_between_largest_values(values, offsets):
+    lengths = numpy.diff(offsets)
+    values = values.astype(numpy.result_type(values.dtype, numpy.float64))
+    largest = _segment_reduce(numpy.maximum, values, offsets, 0)
+    # Remove one occurrence of the largest value of each vector, then the largest remaining one is the second largest
+    segment = numpy.repeat(numpy.arange(len(lengths)), lengths)
+    at_largest = numpy.nonzero(values == largest[segment])[0]
+    _, first = numpy.unique(segment[at_largest], return_index=True)
+    values[at_largest[first]] = -numpy.inf
+    second = _segment_reduce(numpy.maximum, values, offsets, 0)
+    out = numpy.zeros(len(lengths), dtype=values.dtype)
+    valid = lengths >= 2
+    out[valid] = largest[valid] - second[valid]
+    return out
+
+
+def _ragged_difference_between_largest_absolute_values(values, offsets):
+    return _ragged_difference_between_largest_values(numpy.abs(values), offsets)
+
+
+ragged_functions = {
+    "smallest_nonzero_value": _ragged_smallest_nonzero_value,
+    "smallest_nonzero_absolute_value": _ragged_smallest_nonzero_absolute_value,
+    "difference_between_largest_values": _ragged_difference_between_largest_values,
+    "difference_between_largest_absolute_values": _ragged_difference_between_largest_absolute_values,
+    "largest_value": _ragged_largest_value,
+    "largest_absolute_value": _ragged_largest_absolute_value
+}
@@ -0,0 +1,150 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+import pandas
+
+from . import lookup_functions
+from .columnar import ColumnarDatabase, _encode_column
+
+
+def top_n(values, N):
+    """
+    Positions of the N largest values, in ascending order of the values. Equal values are ordered by position, i.e.
+    the same as numpy.argsort(values, kind="stable")[-N:], but without sorting all values.
+    :param values: numpy.array
+    :param N: int
+    :return: numpy.array of ints
+    """
+    values = numpy.asarray(values)
+    N = int(numpy.minimum(N, len(values)))
+    if N <= 0:
+        return numpy.zeros(0, dtype=int)
+    if numpy.iscomplexobj(values) or (values.dtype.kind == "f" and numpy.any(numpy.isnan(values))):
+        # Cannot be partitioned the same way they are sorted
+        return numpy.argsort(values, kind="stable")[-N:]
+    threshold = values[numpy.argpartition(values, len(values) - N)[len(values) - N]]
+    above = numpy.nonzero(values > threshold)[0]
+    at = numpy.nonzero(values == threshold)[0]
+    picked = numpy.hstack([above, at[len(at) - (N - len(above)):]])
+    return picked[numpy.lexsort((picked, values[picked]))]
+
+
+class ReducedColumns(object):
+    """
+    REDUCEDCOLUMNS:
+    Columns of a topological database reduced to a single value per row, as specified in the configuration of the
+    pipeline by a column name and optionally an index or the name of a function in toposample/db/lookup_functions.py:
+        reduced = ReducedColumns(db)
+        reduced.get("bettis", index=2)
+            numpy.array; the third Betti number of each tribe (0 if it has fewer)
+        reduced.get("adj_spectrum", function="largest_absolute_value")
+
+    db can be a pandas.DataFrame or a ColumnarDatabase. Columns of vectors are handled as the concatenation of all
+    vectors plus offsets (memory mapped for a ColumnarDatabase) and reduced for all rows at once. Both these arrays and
+    the reduced columns are cached, so looking up many specifications of the same few columns reads and reduces each
+    only once.
+    """
+    def __init__(self, db):
+        """
+        :param db: pandas.DataFrame or toposample.db.ColumnarDatabase
+        """
+        self.db = db
+        self._ragged = {}
+        self._encodings = {}
+        self._reduced = {}
+
+    @property
+    def index(self):
+        return self.db.index
+
+    def __len__(self):
+        return len(self.db.index)
+
+    def _encoded(self, column):
+        # Same encoding as a column of a ColumnarDatabase: kind of the column and its arrays
+        if column not in self._encodings:
+            self._encodings[column] = _encode_column(self.db[column])
+        return self._encodings[column]
+
+    def ragged(self, column):
+        """
+        :param column: str; name of a column of vectors
+        :return: tuple of numpy.arrays; values and offsets of the column. Entry i is values[offsets[i]:offsets[i + 1]]
+        """
+        if isinstance(self.db, ColumnarDatabase):
+            if column not in self._ragged:
+                self._ragged[column] = self.db.ragged(column)
+            return self._ragged[column]
+        kind, arrays = self._encoded(column)
+        assert kind == "ragged", "{0} is not a column of vectors!".format(column)
+        return arrays["values"], arrays["offsets"]
+
+    def lengths(self, column):
+        """Lengths of the vectors in a column of vectors"""
+        return numpy.diff(self.ragged(column)[1])
+
+    def entry(self, column, i):
+        """
+        :param column: str; name of a column of vectors
+        :param i: int; position of a row
+        :return: numpy.array (view); the vector in row i
+        """
+        values, offsets = self.ragged(column)
+        return values[offsets[i]:offsets[i + 1]]
+
+    def _is_ragged(self, column):
+        if isinstance(self.db, ColumnarDatabase):
+            return self.db.kinds.get(column, None) == "ragged"
+        return self._encoded(column)[0] == "ragged"
+
+    def _reduce(self, column, index, function):
+        if not self._is_ragged(column):
+            values = numpy.asarray(self.db[column].values)
+            if function is not None:
+                function = lookup_functions.__dict__[function]
+                values = numpy.array([function(_x) for _x in values])
+            return values
+        values, offsets = self.ragged(column)
+        if index is not None:
+            lengths = numpy.diff(offsets)
+            out = numpy.zeros(len(lengths), dtype=values.dtype)
+            valid = lengths > index
+            out[valid] = values[offsets[:-1][valid] + index]
+            if function is not None:
+                function = lookup_functions.__dict__[function]
+                out = numpy.array([function(_x) for _x in out])
+            return out
+        if function is None:
+            return self.db[column].values
+        if function in lookup_functions.ragged_functions:
+            return lookup_functions.ragged_functions[function](values, offsets)
+        # No vectorized version: applied to each vector
+        function = lookup_functions.__dict__[function]
+        return numpy.array([function(values[_a:_b]) for _a, _b in zip(offsets[:-1], offsets[1:])])
+
+    def get(self, column, index=None, function=None):
+        """
+        :param column: str; name of the column
+        :param index: int; for a column of vectors: take this entry of each vector (0 if it is too short)
+        :param function: str; name of a function in toposample/db/lookup_functions.py to apply to each entry (after
+        index, if given)
+        :return: numpy.array; the reduced column, one value per row. Cached
+        """
+        key = (column, index, function)
+        if key not in self._reduced:
+            self._reduced[key] = self._reduce(column, index, function)
+        return self._reduced[key]
+
+    def get_series(self, column, index=None, function=None):
+        return pandas.Series(self.get(column, index=index, function=function), index=self.index)
@@ -13,19 +13,95 @@ You should have received a copy of the GNU Affero General Public License along w
 
 import numpy
 
+from .tribes import Tribes, tribal_indices, tribal_chiefs, tribal_membership
+from .submatrices import TribalSubmatrices, tribal_submatrices
+
+
+# Integer gids spread over a range of at most this many times their number are translated with a dense lookup table
+_DENSE_LOOKUP_FACTOR = 4
+
 
 class GidConverter(object):
+    """
+    GIDCONVERTER:
+    Translates between the gids of neurons and their local indices, i.e. their positions in the index of a DataFrame
+    of neuron info, which is also their position in the adjacency matrix. Arrays of gids are translated in a single,
+    vectorized call:
+        conv = GidConverter(neuron_info)
+        conv.indices([62693, 62694, 70001])
+            array([0, 1, 7308])
+
+    Depending on the gids, one of the following is used:
+        contiguous gids: the index of a gid is gid - first gid
+        integer gids, not too sparse: a dense lookup table spanning the range of gids
+        otherwise: binary search in the sorted gids
+    Unknown gids raise a KeyError.
+    """
     def __init__(self, info):
         self._index = info.index
+        assert self._index.is_unique, "gids must be unique!"
+        gids = numpy.asarray(self._index.values)
+        self._offset = None
+        self._lookup = None
+        self._sorted = None
+        if len(gids) > 0 and gids.dtype.kind in "iu":
+            gids = gids.astype(numpy.int64)
+            first, last = gids.min(), gids.max()
+            if numpy.all(numpy.diff(gids) == 1):
+                self._offset = first
+            elif last - first + 1 <= _DENSE_LOOKUP_FACTOR * len(gids):
+                self._offset = first
+                self._lookup = numpy.full(last - first + 1, -1, dtype=numpy.int64)
+                self._lookup[gids - first] = numpy.arange(len(gids))
+            else:
+                order = numpy.argsort(gids, kind="stable")
+                self._sorted = (gids[order], order)
+
+    def _find(self, gids):
+        """
+        :param gids: numpy.array of gids
+        :return: numpy.array of the same shape; local indices of the gids, -1 for unknown gids
+        """
+        if self._offset is None and self._sorted is None:
+            return self._index.get_indexer(gids.ravel()).reshape(gids.shape)
+        if gids.dtype.kind == "f":
+            as_int = gids.astype(numpy.int64)
+            found = self._find(as_int)
+            found[as_int != gids] = -1
+            return found
+        if gids.dtype.kind not in "iu":
+            return self._index.get_indexer(gids.ravel()).reshape(gids.shape)
+        gids = gids.astype(numpy.int64)
+        if self._sorted is not None:
+            sorted_gids, order = self._sorted
+            pos = numpy.minimum(numpy.searchsorted(sorted_gids, gids), len(sorted_gids) - 1)
+            return numpy.where(sorted_gids[pos] == gids, order[pos], -1)
+        idxx = gids - self._offset
+        valid = (idxx >= 0) & (idxx < (len(self._index) if self._lookup is None else len(self._lookup)))
+        idxx = numpy.where(valid, idxx, 0)
+        if self._lookup is not None:
+            idxx = self._lookup[idxx]
+        return numpy.where(valid, idxx, -1)
 
     def index(self, gid):
-        return self._index.get_loc(gid)
+        return int(self.indices([gid])[0])
 
     def gid(self, idx):
         return self._index[idx]
 
     def indices(self, gids):
-        return numpy.array([self.index(_g) for _g in gids])
+        """
+        :param gids: list or numpy.array of gids
+        :return: numpy.array of the same shape; their local indices
+        """
+        gids = numpy.asarray(gids)
+        if gids.size == 0:
+            return numpy.zeros(gids.shape, dtype=numpy.int64)
+        idxx = self._find(gids)
+        if numpy.any(idxx < 0):
+            unknown = numpy.unique(gids[idxx < 0])
+            raise KeyError("{0} unknown gid(s), e.g. {1}".format(len(unknown), unknown[:5].tolist()))
+        return idxx
 
     def gids(self, idxx):
         return self._index[idxx]
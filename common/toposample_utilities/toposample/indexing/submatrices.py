@@ -0,0 +1,109 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+
+from .tribes import Tribes, tribal_indices
+
+
+class TribalSubmatrices(object):
+    """
+    TRIBALSUBMATRICES:
+    The adjacency matrices of all tribes, i.e. of the subgraphs induced by their members. They are extracted once,
+    directly from the index arrays of the adjacency matrix, and kept in three flat arrays:
+        indices: the (tribe-local) column indices of the edges of all tribes, concatenated
+        data: the associated entries of the adjacency matrix
+        row_ptrs: for each tribe its own row pointer array of length len(tribe) + 1, concatenated
+    Usually obtained through Tribes.submatrices, which caches it, such that all parameters calculated in a run of
+    gen_topo_db share the same extraction:
+        submats = tribes.submatrices(adj_matrix)
+        submats[0]
+            <547x547 sparse matrix of type '<class 'numpy.bool_'>' with 12007 stored elements in CSR format>
+
+    Rows and columns of a tribal matrix are in the order of the members of the tribe, i.e. in the order of
+    tribes.local_indices(i). Same as adj_matrix[numpy.ix_(tribe_ids, tribe_ids)], but the returned matrix is built
+    from views into the flat arrays.
+    """
+    def __init__(self, tribes, adj_matrix):
+        """
+        :param tribes: toposample.indexing.Tribes
+        :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+        """
+        self.tribes = tribes
+        self.adj_matrix = adj_matrix
+        self.row_ptrs, self.indices, self.data, self.offsets = self._extract(tribes, adj_matrix)
+
+    @staticmethod
+    def _extract(tribes, adj_matrix):
+        A = adj_matrix.tocsr()
+        if not A.has_sorted_indices:
+            A = A.sorted_indices()
+        # Position of each neuron in the tribe currently being extracted; -1 for non-members
+        position = numpy.full(A.shape[0], -1, dtype=numpy.int32)
+        row_ptrs, indices, data = [], [], []
+        for members in tribes.iter_local_indices():
+            position[members] = numpy.arange(len(members))
+            starts = A.indptr[members]
+            lengths = A.indptr[members + 1] - starts
+            # Positions in A.indices of the efferent edges of all members
+            edge_idx = numpy.repeat(starts - numpy.cumsum(lengths) + lengths, lengths) + numpy.arange(lengths.sum())
+            cols = position[A.indices[edge_idx]]
+            inside = cols >= 0
+            rows = numpy.repeat(numpy.arange(len(members)), lengths)[inside]
+            row_ptrs.append(numpy.hstack([0, numpy.cumsum(numpy.bincount(rows, minlength=len(members)))]))
+            indices.append(cols[inside])
+            data.append(A.data[edge_idx[inside]])
+            position[members] = -1
+        offsets = numpy.cumsum([0] + [len(_idx) for _idx in indices])
+        return (_concatenate(row_ptrs, numpy.int32), _concatenate(indices, numpy.int32),
+                _concatenate(data, A.dtype), offsets)
+
+    @property
+    def edge_counts(self):
+        """Number of edges within each tribe"""
+        return numpy.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.tribes)
+
+    def __getitem__(self, i):
+        from scipy import sparse
+        n = self.tribes.indptr[i + 1] - self.tribes.indptr[i]
+        row_start = self.tribes.indptr[i] + i
+        edges = slice(self.offsets[i], self.offsets[i + 1])
+        return sparse.csr_matrix((self.data[edges], self.indices[edges], self.row_ptrs[row_start:row_start + n + 1]),
+                                 shape=(n, n), copy=False)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _concatenate(arrays, dtype):
+    if len(arrays) == 0:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.concatenate(arrays).astype(dtype, copy=False)
+
+
+def tribal_submatrices(tribes, adj_matrix, conv):
+    """
+    Iterate over the adjacency matrices of the tribes. If tribes is a Tribes object, they are taken from its cached
+    TribalSubmatrices, otherwise they are sliced out of adj_matrix one by one.
+    :param tribes: Tribes or iterable of lists of gids
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+    :param conv: toposample.indexing.GidConverter
+    :return: generator of scipy.sparse matrices
+    """
+    if isinstance(tribes, Tribes):
+        return iter(tribes.submatrices(adj_matrix))
+    return (adj_matrix[numpy.ix_(tribe_ids, tribe_ids)] for tribe_ids in tribal_indices(tribes, conv))
@@ -0,0 +1,227 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy
+
+
+class Tribes(object):
+    """
+    TRIBES:
+    The tribes of a population of neurons, stored as a single indptr / indices pair in compressed sparse row layout.
+    The members of tribe i are the neurons at the local indices (i.e. indices into the adjacency matrix)
+    indices[indptr[i]:indptr[i + 1]]; the chief of tribe i is the neuron at local index chiefs[i].
+
+    Build it from the adjacency matrix of the population:
+        tribes = Tribes.from_adjacency(adj_matrix, neuron_info)
+
+    The object behaves like a sequence of gid arrays, one per tribe, so it can be used wherever a list or column of
+    tribal gids is expected:
+        len(tribes)
+            31346
+        tribes[0]
+            array([    1,    12,   101, ..., 31077, 31110, 31234])
+        for tribe in tribes:
+            ...
+
+    The arrays handed out (both gids and local indices) are views into the underlying flat arrays, not copies.
+    Slicing returns a Tribes object holding a contiguous range of tribes:
+        tribes[100:200]
+    """
+    def __init__(self, indptr, indices, gids, chiefs=None):
+        """
+        :param indptr: numpy.array; offsets of the individual tribes into indices. Length: number of tribes + 1
+        :param indices: numpy.array; local indices of the members of all tribes, concatenated
+        :param gids: numpy.array; gids of all neurons in the population, i.e. the gid of local index i is gids[i]
+        :param chiefs: numpy.array; local indices of the chiefs of the tribes. Default: tribe i has chief i
+        """
+        self.indptr = numpy.asarray(indptr)
+        self.indices = numpy.asarray(indices)
+        self.population_gids = numpy.asarray(gids)
+        if chiefs is None:
+            chiefs = numpy.arange(len(self.indptr) - 1)
+        self.chiefs = numpy.asarray(chiefs)
+        assert len(self.chiefs) == len(self.indptr) - 1, "Need exactly one chief per tribe!"
+        self._member_gids = None
+        self._submatrices = None
+        self._derived = (None, {})
+
+    @classmethod
+    def from_adjacency(cls, adj_matrix, neuron_info):
+        """
+        Calculate tribes, i.e. each neuron and all neurons adjacent to it (in either direction)
+        :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+        :param neuron_info: pandas.DataFrame; additional neuron info; its index provides the gids of the neurons
+        :return: Tribes; tribe i is centered on the neuron at local index i
+        """
+        from scipy import sparse
+        A = adj_matrix.astype(bool)
+        # Add transpose to get both in- and out-neighbors and the diagonal such that each chief is part of its tribe.
+        M = (A + A.transpose() + sparse.identity(A.shape[0], dtype=bool)).tocsr()
+        M.sort_indices()
+        return cls(M.indptr, M.indices, neuron_info.index.values)
+
+    @classmethod
+    def from_gid_lists(cls, tribe_gids, index):
+        """
+        :param tribe_gids: iterable of lists of gids; the members of each tribe
+        :param index: pandas.Index; gids of all neurons in the population, e.g. the index of neuron_info or of the
+        topological database
+        :return: Tribes; tribe i consists of tribe_gids[i] and has the neuron at local index i as its chief
+        """
+        from . import GidConverter
+        tribe_gids = [numpy.asarray(_t) for _t in tribe_gids]
+        indptr = numpy.hstack([0, numpy.cumsum([len(_t) for _t in tribe_gids])]).astype(numpy.int64)
+        gids = numpy.hstack([numpy.zeros(0, dtype=index.dtype)] + tribe_gids)
+        return cls(indptr, GidConverter(index.to_frame()).indices(gids), index.values)
+
+    @property
+    def member_gids(self):
+        """gids of the members of all tribes, concatenated. Translated once, then cached"""
+        if self._member_gids is None:
+            self._member_gids = self.population_gids[self.indices]
+        return self._member_gids
+
+    @property
+    def sizes(self):
+        return numpy.diff(self.indptr)
+
+    @property
+    def chief_gids(self):
+        return self.population_gids[self.chiefs]
+
+    def local_indices(self, i):
+        """
+        :param i: int; index of a tribe
+        :return: numpy.array (view); local indices of the members of tribe i
+        """
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def gids(self, i):
+        """
+        :param i: int; index of a tribe
+        :return: numpy.array (view); gids of the members of tribe i
+        """
+        return self.member_gids[self.indptr[i]:self.indptr[i + 1]]
+
+    def submatrices(self, adj_matrix):
+        """
+        :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+        :return: toposample.indexing.TribalSubmatrices; the adjacency matrices of all tribes. Extracted on the first
+        call, then cached for subsequent calls with the same adj_matrix.
+        """
+        from .submatrices import TribalSubmatrices
+        if self._submatrices is None or self._submatrices.adj_matrix is not adj_matrix:
+            self._submatrices = TribalSubmatrices(self, adj_matrix)
+        return self._submatrices
+
+    def derived(self, adj_matrix):
+        """
+        Storage for results derived from the tribes and adj_matrix that are needed for more than one parameter. Store
+        them under a name of choice.
+        :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+        :return: dict; emptied when called with a different adj_matrix
+        """
+        if self._derived[0] is not adj_matrix:
+            self._derived = (adj_matrix, {})
+        return self._derived[1]
+
+    def membership_matrix(self):
+        """
+        :return: scipy.sparse.csr_matrix of shape (number of tribes, number of neurons); entry (i, j) is 1 if the neuron
+        at local index j is a member of tribe i, else 0. Built from views of indptr and indices.
+        """
+        from scipy import sparse
+        return sparse.csr_matrix((numpy.ones(len(self.indices), dtype=numpy.int32), self.indices, self.indptr),
+                                 shape=(len(self), len(self.population_gids)), copy=False)
+
+    def iter_local_indices(self):
+        for i in range(len(self)):
+            yield self.local_indices(i)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            assert step == 1, "Only contiguous ranges of tribes supported!"
+            stop = max(start, stop)
+            offset = self.indptr[start]
+            sub = Tribes(self.indptr[start:stop + 1] - offset,
+                         self.indices[offset:self.indptr[stop]],
+                         self.population_gids, chiefs=self.chiefs[start:stop])
+            if self._member_gids is not None:
+                sub._member_gids = self._member_gids[offset:self.indptr[stop]]
+            return sub
+        if item < 0:
+            item += len(self)
+        return self.gids(item)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.gids(i)
+
+    def to_series(self, index=None):
+        """
+        :param index: index of the returned Series. Default: gids of the chiefs
+        :return: pandas.Series with one entry per tribe, holding views into the gids of its members
+        """
+        import pandas
+        if index is None:
+            index = self.chief_gids
+        values = numpy.empty(len(self), dtype=object)
+        for i, tribe in enumerate(numpy.split(self.member_gids, self.indptr[1:-1])):
+            values[i] = tribe
+        return pandas.Series(values, index=index)
+
+
+def tribal_indices(tribes, conv):
+    """
+    Iterate over the local indices of the members of each tribe. If tribes is a Tribes object, the indices are
+    read directly from it, otherwise the gids of each tribe are converted.
+    :param tribes: Tribes or iterable of lists of gids
+    :param conv: toposample.indexing.GidConverter
+    :return: generator of numpy.arrays
+    """
+    if isinstance(tribes, Tribes):
+        return tribes.iter_local_indices()
+    return (conv.indices(tribe) for tribe in tribes)
+
+
+def tribal_chiefs(tribes):
+    """
+    :param tribes: Tribes or iterable of lists of gids
+    :return: numpy.array; local indices of the chiefs of the tribes. For anything but a Tribes object the tribes are
+    assumed to be in the order of the adjacency matrix, i.e. tribe i is centered on the neuron at local index i.
+    """
+    if isinstance(tribes, Tribes):
+        return tribes.chiefs
+    return numpy.arange(len(tribes))
+
+
+def tribal_membership(tribes, adj_matrix, conv):
+    """
+    :param tribes: Tribes or iterable of lists of gids
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+    :param conv: toposample.indexing.GidConverter
+    :return: scipy.sparse.csr_matrix of shape (number of tribes, number of neurons); entry (i, j) is 1 if the neuron at
+    local index j is a member of tribe i, else 0
+    """
+    if isinstance(tribes, Tribes):
+        return tribes.membership_matrix()
+    from scipy import sparse
+    indices = [numpy.asarray(_ids, dtype=int) for _ids in tribal_indices(tribes, conv)]
+    indptr = numpy.hstack([0, numpy.cumsum([len(_ids) for _ids in indices])])
+    indices = numpy.hstack([numpy.zeros(0, dtype=int)] + indices)
+    return sparse.csr_matrix((numpy.ones(len(indices), dtype=numpy.int32), indices, indptr),
+                             shape=(len(indptr) - 1, adj_matrix.shape[0]))
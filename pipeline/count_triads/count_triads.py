@@ -25,7 +25,7 @@ from toposample.indexing import GidConverter
 
 """
 count_triads.py
-Part of the topological sampling pipeline that counts for all generated samples (see sample_tribes-*.py, tribes.json)
+Part of the topological sampling pipeline that counts for all generated samples (see sample_tribes-*.py, tribes.h5)
 the overexpression of triad motifs. It counts the number of different motifs in a sample and also calculates the 
 expected number according to two control models and the mean connection probability in the sample.
 """
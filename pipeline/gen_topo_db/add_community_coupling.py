@@ -13,9 +13,9 @@ You should have received a copy of the GNU Affero General Public License along w
 
 import numpy
 import pandas
-import progressbar
 from scipy import sparse
 from toposample import Config
+from toposample.db import read_tribes, add_columns
 from toposample.indexing import GidConverter
 
 
@@ -35,18 +35,55 @@ def calculate_community_coupling(spikes, conv, stage_config):
                           shape=(len(conv._index), len(t_bins) - 1))
     M = M.asformat("csr")
 
-    fr = numpy.array(M.mean(axis=0))[0]
-    coeff = []
-    pbar = progressbar.ProgressBar()
-    for idxx in pbar(range(M.shape[0])):
-        firing_idv = M[idxx].toarray().astype(float)[0]
-        firing_pop = fr - firing_idv / M.shape[0]
-        coeff.append(numpy.corrcoef(firing_pop, firing_idv)[1, 0])
-    return numpy.array(coeff)
-
-
-def write_output(DB, output_fn):
-    DB.to_pickle(output_fn)
+    return coupling_coefficients(M)
+
+
+def coupling_coefficients(M, chunk_size=10000):
+    """
+    Pearson correlation of the spike train of each neuron with the spike trains of all other neurons combined, i.e.
+    with the number of other neurons spiking in each time bin. Calculated from the moments of the binned spike trains:
+    the number of spiking neurons in each time bin (s), and for each neuron the number of time bins it spikes in (x.x)
+    and the number of other neurons spiking with it (x.s). The products x.s are calculated for chunk_size neurons at a
+    time, such that beyond M itself, memory grows only with the number of neurons and time bins, not with the number of
+    spikes.
+    :param M: scipy.sparse.csr_matrix; neurons x time bins; True where a neuron spikes in a time bin
+    :param chunk_size: int; number of neurons (rows of M) per chunk
+    :return: numpy.array; for each neuron its correlation coefficient. nan for neurons that never or always spike
+    """
+    M = sparse.csr_matrix(M, dtype=bool)
+    n_neurons, n_bins = M.shape
+    s = numpy.array(M.sum(axis=0), dtype=numpy.float64)[0]  # Number of spiking neurons per time bin
+    # Spike trains are binary: sum(x) = sum(x * x)
+    x_x = numpy.array(M.sum(axis=1), dtype=numpy.float64)[:, 0]
+    x_s = numpy.zeros(n_neurons, dtype=numpy.float64)
+    for start in range(0, n_neurons, chunk_size):
+        stop = min(start + chunk_size, n_neurons)
+        x_s[start:stop] = M[start:stop].astype(numpy.float64).dot(s)
+    # Population without the neuron itself: p = s - x
+    p_sum = s.sum() - x_x
+    p_p = (s * s).sum() - 2 * x_s + x_x
+    x_p = x_s - x_x
+    cov = x_p - x_x * p_sum / n_bins
+    var_x = x_x - x_x * x_x / n_bins
+    var_p = p_p - p_sum * p_sum / n_bins
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        coeff = cov / numpy.sqrt(var_x * var_p)
+    return numpy.clip(coeff, -1, 1)
+
+
+def tribal_coupling(coupling, conv, tribes):
+    """
+    :param coupling: numpy.array; community coupling of all neurons, in the order of conv
+    :param conv: toposample.indexing.GidConverter
+    :param tribes: toposample.indexing.Tribes
+    :return: list of numpy.arrays; for each tribe the community coupling of its members
+    """
+    values = coupling[conv.indices(tribes.population_gids)][tribes.indices]
+    return numpy.split(values, tribes.indptr[1:-1])
+
+
+def write_output(columns, output_fn):
+    add_columns(output_fn, columns)
 
 
 def main(path_to_config):
@@ -61,12 +98,11 @@ def main(path_to_config):
 
     coupling = calculate_community_coupling(spikes, conv, topo_db_cfg)
 
-    existing_db = pandas.read_pickle(stage["outputs"]["database"])
-    existing_db["comm_coupling"] = coupling
-    existing_db["tribe_comm_coupling"] = [coupling[conv.indices(existing_db['tribe'].iloc[i])]
-                                          for i in range(len(existing_db))]
+    tribes = read_tribes(stage["outputs"]["database"])
+    new_columns = {"comm_coupling": coupling[conv.indices(tribes.population_gids)],
+                   "tribe_comm_coupling": tribal_coupling(coupling, conv, tribes)}
 
-    write_output(existing_db, stage["outputs"]["database"])
+    write_output(new_columns, stage["outputs"]["database"])
 
 
 if __name__ == "__main__":
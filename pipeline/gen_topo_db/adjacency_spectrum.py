@@ -11,25 +11,21 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General
 You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import numpy as np
 import progressbar
-import scipy.linalg
 
+from toposample.indexing import tribal_submatrices
 
-def compute(tribes, adj_matrix, conv, precision):
+from eigenvalues import nonzero_spectrum
 
-    spectra = []
-    pbar = progressbar.ProgressBar()
 
-    for tribe in pbar(tribes):
-        tribe_ids = conv.indices(tribe)
-        adj_submat = adj_matrix[np.ix_(tribe_ids, tribe_ids)]
+def compute(tribes, adj_matrix, conv, precision, **spectrum_kwargs):
+
+    spectra = []
+    pbar = progressbar.ProgressBar(maxval=len(tribes))
 
-        # Find the eigenvalues
-        eig = scipy.linalg.eig(adj_submat.todense())[0]
+    for adj_submat in pbar(tribal_submatrices(tribes, adj_matrix, conv)):
 
-        # Order the non-zero eigenvalues and round to desired precision
-        spectrum = np.unique(np.round(eig[np.nonzero(eig)], precision))
-        spectra.append(spectrum)
+        # Find the non-zero eigenvalues
+        spectra.append(nonzero_spectrum(adj_submat, precision, **spectrum_kwargs))
         
     return spectra
@@ -13,36 +13,31 @@ You should have received a copy of the GNU Affero General Public License along w
 
 import numpy as np
 import progressbar
-import scipy.linalg
+from scipy import sparse
 
+from toposample.indexing import tribal_submatrices
 
-def compute(tribes, adj_matrix, conv, precision):
+from eigenvalues import nonzero_spectrum
+
+
+def compute(tribes, adj_matrix, conv, precision, **spectrum_kwargs):
 
     spectra = []
-    #  In csc format we can get the in-degree easily as the diff of the .indptr property
-    assert adj_matrix.getformat() == 'csc'
-    pbar = progressbar.ProgressBar()
+    pbar = progressbar.ProgressBar(maxval=len(tribes))
 
-    for tribe in pbar(tribes):
-        tribe_ids = conv.indices(tribe)
-        adj_submat = adj_matrix[np.ix_(tribe_ids, tribe_ids)]
+    for adj_submat in pbar(tribal_submatrices(tribes, adj_matrix, conv)):
 
         # Construct Bauer Laplacian matrix from vertices that are not sources, i.e. all those whose indegree is not zero
-        not_source_vertices = np.nonzero(np.diff(adj_submat.indptr))[0]  # Because this is csc format
+        not_source_vertices = np.nonzero(adj_submat.getnnz(axis=0))[0]  # Stored entries per column: the in-degree
         tribe_nosources = adj_submat[np.ix_(not_source_vertices, not_source_vertices)]
         size_tribe_nosources = tribe_nosources.shape[0]
-        matrix_D_inv = np.diagflat(np.power((size_tribe_nosources -
-                                             np.diff(tribe_nosources.indptr)).astype(float),
-                                            -1))
-        matrix_W = np.transpose(tribe_nosources) 
-        matrix_bauer_laplacian = np.subtract(np.eye(size_tribe_nosources, dtype=int),
-                                             matrix_D_inv @ matrix_W)
-
-        # Find the eigenvalues
-        eig = scipy.linalg.eig(matrix_bauer_laplacian)[0]
-
-        # Order the non-zero eigenvalues and round to desired precision
-        spectrum = np.unique(np.round(eig[np.nonzero(eig)], precision))
-        spectra.append(spectrum)
+        matrix_D_inv = sparse.diags(np.power((size_tribe_nosources -
+                                              tribe_nosources.getnnz(axis=0)).astype(float),
+                                             -1))
+        matrix_W = tribe_nosources.transpose()
+        matrix_bauer_laplacian = sparse.identity(size_tribe_nosources) - matrix_D_inv @ matrix_W
+
+        # Find the non-zero eigenvalues
+        spectra.append(nonzero_spectrum(matrix_bauer_laplacian, precision, **spectrum_kwargs))
         
     return spectra
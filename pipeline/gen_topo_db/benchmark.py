@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import functools
+import importlib
+import contextlib
+import tracemalloc
+import multiprocessing
+import numpy
+import progressbar
+import pandas as pd
+
+from scipy import sparse
+
+from toposample import config
+from toposample.indexing import GidConverter
+
+import simplex_containment
+from gen_topo_db import calculate_tribes
+
+MTYPES = ["L1_DAC", "L23_PC", "L4_SS", "L5_TPC", "L6_TPC"]
+
+
+def synthetic_connectome(n_neurons, density, reciprocity, seed=0):
+    """
+    Random directed graph and matching neuron info, to benchmark the calculation of the parameters without the real
+    data. Pairs of neurons are connected at random; a connected pair is connected in both directions with a probability
+    chosen such that the expected fraction of reciprocal edges is reciprocity, otherwise in a random direction.
+    :param n_neurons: int; number of neurons
+    :param density: float; expected fraction of all possible (directed) edges that are present
+    :param reciprocity: float; expected fraction of edges that are part of a reciprocal pair
+    :param seed: int; seed of the random number generator
+    :return: tuple; the adjacency matrix (scipy.sparse.csr_matrix of bools) and neuron info (pandas.DataFrame with
+    columns x, y, z, layer and mtype, indexed by gid)
+    """
+    assert 0 <= density <= 1 and 0 <= reciprocity <= 1, "density and reciprocity must be between 0 and 1!"
+    rng = numpy.random.RandomState(seed)
+    p_both = reciprocity / (2.0 - reciprocity)
+    n_pairs = int(round(density * n_neurons * (n_neurons - 1) / (1.0 + p_both)))
+    n_pairs = min(n_pairs, n_neurons * (n_neurons - 1) // 2)
+
+    # Draw more pairs than needed, as some are drawn twice or are self-connections
+    pairs = numpy.zeros(0, dtype=numpy.int64)
+    while len(pairs) < n_pairs:
+        n_draw = int(1.2 * (n_pairs - len(pairs))) + 16
+        a, b = rng.randint(0, n_neurons, n_draw), rng.randint(0, n_neurons, n_draw)
+        valid = a != b
+        lo, hi = numpy.minimum(a, b)[valid], numpy.maximum(a, b)[valid]
+        pairs = numpy.unique(numpy.hstack([pairs, lo.astype(numpy.int64) * n_neurons + hi]))
+    pairs = rng.permutation(pairs)[:n_pairs]
+    lo, hi = pairs // n_neurons, pairs % n_neurons
+
+    both = rng.rand(n_pairs) < p_both
+    forward = rng.rand(n_pairs) < 0.5
+    rows = numpy.hstack([lo[both | forward], hi[both | ~forward]])
+    cols = numpy.hstack([hi[both | forward], lo[both | ~forward]])
+    adj_matrix = sparse.csr_matrix((numpy.ones(len(rows), dtype=bool), (rows, cols)), shape=(n_neurons, n_neurons))
+
+    layers = rng.randint(1, 7, n_neurons)
+    neuron_info = pd.DataFrame({"x": rng.rand(n_neurons) * 500.0,
+                                "y": 2000.0 - layers * 300.0 + rng.rand(n_neurons) * 300.0,
+                                "z": rng.rand(n_neurons) * 500.0,
+                                "layer": layers,
+                                "mtype": numpy.array(MTYPES)[rng.randint(0, len(MTYPES), n_neurons)]},
+                               index=pd.Index(numpy.arange(n_neurons) + 1000, name="gid"))
+    return adj_matrix, neuron_info
+
+
+def graph_statistics(adj_matrix):
+    A = adj_matrix.tocsr().astype(bool)
+    n = A.shape[0]
+    n_edges = A.nnz
+    n_reciprocal = A.multiply(A.transpose()).nnz
+    return {"neurons": n,
+            "edges": int(n_edges),
+            "density": float(n_edges) / max(n * (n - 1), 1),
+            "reciprocity": float(n_reciprocal) / max(n_edges, 1)}
+
+
+def _peak_rss(func):
+    """
+    Call a function in a child process and measure the peak of its resident set size (RSS). Unlike tracemalloc, this
+    includes memory allocated by extension modules (e.g. inside pyflagsercontain). The child is forked, so it starts
+    with the memory of this process.
+    :return: tuple; peak RSS of the child and the part of it reached during the call (both in bytes)
+    """
+    import resource
+    ctx = multiprocessing.get_context("fork")
+    receiver, sender = ctx.Pipe(duplex=False)
+
+    def run():
+        start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        func()
+        sender.send((start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+    child = ctx.Process(target=run)
+    child.start()
+    # Such that receiving fails instead of waiting forever if the child dies
+    sender.close()
+    try:
+        start, peak = receiver.recv()
+    except EOFError:
+        raise Exception("Memory measurement failed with exit code {0}".format(child.exitcode))
+    finally:
+        child.join()
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return peak * unit, (peak - start) * unit
+
+
+def measure(func, repeats=1):
+    """
+    Time a function and measure the memory it uses. It is called repeats times to take the time, once more with
+    tracemalloc tracing the allocations of the python allocators, and once in a child process to measure its peak
+    resident set size.
+    :param func: callable without arguments. It must not rely on results cached by earlier calls
+    :param repeats: int; number of calls to take the time of
+    :return: dict; fastest and mean time (in seconds) of the calls, peak of the traced memory, peak RSS of the child
+    process and the increase of it during the call (in bytes)
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    peak_rss, rss_increase = _peak_rss(func)
+    return {"time": min(times), "mean_time": float(numpy.mean(times)), "peak_memory": peak,
+            "peak_rss": peak_rss, "rss_increase": rss_increase}
+
+
+@contextlib.contextmanager
+def quiet_progress_bars():
+    """
+    Within the context, the progress bars of the parameter modules write to the null device. Unlike redirecting
+    stderr, which is where they write to otherwise, this still shows warnings and tracebacks.
+    """
+    original = progressbar.ProgressBar
+    with open(os.devnull, "w") as devnull:
+        progressbar.ProgressBar = functools.partial(original, fd=devnull)
+        try:
+            yield
+        finally:
+            progressbar.ProgressBar = original
+
+
+def check_subset_counts(adj_matrix, tribes, chunks=3):
+    """
+    Check that counting the simplices of contiguous ranges of tribes, as the worker processes of gen_topo_db do, gives
+    the same results as counting all tribes at once. Raises an Exception if not.
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+    :param tribes: toposample.indexing.Tribes; the tribes of all neurons
+    :param chunks: int; number of ranges of tribes
+    """
+    from pyflagsercontain import flagser_count_subsets
+    full = flagser_count_subsets(adj_matrix, tribes.indptr, tribes.indices)
+    bounds = numpy.linspace(0, len(tribes), chunks + 1).astype(int)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        sub = tribes[start:stop]
+        part = flagser_count_subsets(adj_matrix, sub.indptr, sub.indices)
+        expected = full[tribes.indptr[start]:tribes.indptr[stop]]
+        # Each call pads its result to the largest dimension among its own subsets
+        if part.shape[1] > expected.shape[1] or not numpy.array_equal(expected[:, :part.shape[1]], part) or \
+                numpy.any(expected[:, part.shape[1]:]):
+            raise Exception("Simplex counts of tribes {0} to {1} differ from counting all tribes at once!".format(
+                start, stop))
+
+
+def benchmark_connectome(adj_matrix, neuron_info, topo_db_cfg, parameters, repeats=1):
+    """
+    Measure the calculation of the tribes, the simplex counts and each parameter for one connectome, after checking
+    that the tribes can be counted in ranges as gen_topo_db does with several workers. Every call starts
+    from scratch, i.e. with new tribes and without simplex counts kept in memory, such that the results of a parameter
+    include the cost of everything it needs.
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+    :param neuron_info: pandas.DataFrame; additional neuron info, indexed by gid
+    :param topo_db_cfg: dict; configuration of the gen_topo_db step
+    :param parameters: list; names of the parameters to measure
+    :param repeats: int; number of timed calls each
+    :return: dict; the results of measure for "calculate_tribes", "flagser_count", "flagser_count_subsets" and each
+    parameter that could be loaded
+    """
+    from pyflagsercontain import flagser_count, flagser_count_subsets
+    conv = GidConverter(neuron_info)
+    tribes = calculate_tribes(adj_matrix, neuron_info)
+    check_subset_counts(adj_matrix, tribes)
+    results = {"calculate_tribes": measure(lambda: calculate_tribes(adj_matrix, neuron_info), repeats=repeats),
+               "flagser_count": measure(lambda: flagser_count(adj_matrix), repeats=repeats),
+               "flagser_count_subsets": measure(lambda: flagser_count_subsets(adj_matrix, tribes.indptr,
+                                                                              tribes.indices), repeats=repeats)}
+
+    for parameter in parameters:
+        assert parameter in topo_db_cfg["parameters"], "Parameter {0} not in config!".format(parameter)
+        try:
+            module = importlib.import_module(topo_db_cfg[parameter]["source"])
+        except ImportError as e:
+            print(e)
+            print("Unable to load module for {0}".format(parameter))
+            continue
+        kwargs = topo_db_cfg[parameter].get("kwargs", {})
+
+        def run():
+            simplex_containment.clear_memory()
+            module.compute(calculate_tribes(adj_matrix, neuron_info), adj_matrix, conv, topo_db_cfg["precision"],
+                           **kwargs)
+        print("Benchmarking {0}...".format(parameter))
+        results[parameter] = measure(run, repeats=repeats)
+    return results
+
+
+def compare_results(results, baseline, tolerance=1.25):
+    """
+    Find the measurements that got slower compared to an earlier benchmark run
+    :param results: dict; results of this run, as written by main
+    :param baseline: dict; results of an earlier run
+    :param tolerance: float; a measurement counts as a regression if it takes longer than tolerance times as long
+    :return: list of tuples; (connectome, name of the measurement, ratio of the times) for each regression
+    """
+    earlier = dict([((_g["neurons"], _g["target_density"], _g["target_reciprocity"]), _g["results"])
+                    for _g in baseline["connectomes"]])
+    regressions = []
+    for graph in results["connectomes"]:
+        key = (graph["neurons"], graph["target_density"], graph["target_reciprocity"])
+        for name, res in graph["results"].items():
+            if name not in earlier.get(key, {}):
+                continue
+            ratio = res["time"] / max(earlier[key][name]["time"], 1E-9)
+            if ratio > tolerance:
+                regressions.append((key, name, ratio))
+    return regressions
+
+
+def main(path_to_config, sizes, density, reciprocity, parameters=None, out_fn=None, baseline_fn=None, repeats=1,
+         seed=0):
+    # Get configuration related to the current pipeline stage
+    cfg = config.Config(path_to_config)
+    stage = cfg.stage("gen_topo_db")
+    topo_db_cfg = stage["config"]
+    if parameters is None or len(parameters) == 0:
+        parameters = topo_db_cfg["parameters"]
+    if out_fn is None:
+        out_fn = os.path.join(stage["other"], "benchmark.json")
+    # Counts of simplices must not be loaded from earlier runs
+    simplex_containment.set_cache_dir(None)
+
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "host": {"platform": platform.platform(), "python": platform.python_version(),
+                        "numpy": numpy.__version__, "cpus": os.cpu_count()},
+               "repeats": repeats,
+               "seed": seed,
+               "connectomes": []}
+    for n_neurons in sizes:
+        print("Benchmarking a random connectome of {0} neurons...".format(n_neurons))
+        adj_matrix, neuron_info = synthetic_connectome(n_neurons, density, reciprocity, seed=seed)
+        graph = graph_statistics(adj_matrix)
+        graph.update({"target_density": density, "target_reciprocity": reciprocity})
+        with quiet_progress_bars():
+            graph["results"] = benchmark_connectome(adj_matrix, neuron_info, topo_db_cfg, parameters,
+                                                    repeats=repeats)
+        results["connectomes"].append(graph)
+
+    out_dir = os.path.split(os.path.abspath(out_fn))[0]
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    with open(out_fn, "w") as fid:
+        json.dump(results, fid, indent=2)
+    print("Results written to {0}".format(out_fn))
+
+    if baseline_fn is not None:
+        with open(baseline_fn, "r") as fid:
+            baseline = json.load(fid)
+        regressions = compare_results(results, baseline)
+        for key, name, ratio in regressions:
+            print("Regression: {0} on {1} neurons takes {2:.2f} times as long as in {3}".format(name, key[0], ratio,
+                                                                                          baseline_fn))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    import getopt
+
+    opts, args = getopt.getopt(sys.argv[1:], "n:d:r:o:c:R:s:",
+                               ["neurons=", "density=", "reciprocity=", "output=", "compare=", "repeats=", "seed="])
+    opts = dict(opts)
+
+    def option(short, long, default):
+        return opts.get("--" + long, opts.get("-" + short, default))
+    main(args[0],
+         [int(_n) for _n in option("n", "neurons", "500,2000").split(",")],
+         float(option("d", "density", 0.01)),
+         float(option("r", "reciprocity", 0.1)),
+         parameters=args[1:],
+         out_fn=option("o", "output", None),
+         baseline_fn=option("c", "compare", None),
+         repeats=int(option("R", "repeats", 1)),
+         seed=int(option("s", "seed", 0)))
@@ -11,22 +11,8 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General
 You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import numpy as np
-import progressbar
-
-import pyflagser
+from flagser_features import flagser_features
 
 
 def compute(tribes, adj_matrix, conv, precision):
-
-    bettis = []
-    pbar = progressbar.ProgressBar()
-
-    for tribe in pbar(tribes):
-        # Convert from GIDs to local indexing
-        tribe_local_indices = conv.indices(tribe)
-
-        adj_submat = adj_matrix[np.ix_(tribe_local_indices, tribe_local_indices)]
-        bettis.append(pyflagser.flagser_unweighted(adj_submat, directed=True)['betti'])
-
-    return bettis
+    return [features['betti'] for features in flagser_features(tribes, adj_matrix, conv)]
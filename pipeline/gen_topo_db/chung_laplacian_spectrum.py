@@ -1,45 +1,65 @@
-"""
-toposampling - Topology-assisted sampling and analysis of activity data
-Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
-
-This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
-published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
-
-This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
-MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
-
-You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
-"""
-
-import numpy as np
-import progressbar
-import scipy.linalg
-
-
-def compute(tribes, adj_matrix, conv, precision):
-    import networkx as nx
-
-    spectra = []
-    pbar = progressbar.ProgressBar()
-
-    for tribe in pbar(tribes):
-        tribe_ids = conv.indices(tribe)
-        adj_submat = adj_matrix[np.ix_(tribe_ids, tribe_ids)]
-        G = nx.from_scipy_sparse_matrix(adj_submat, create_using=nx.DiGraph)
-
-        # Find the largest connected component of the graph
-        largest = max(nx.strongly_connected_components(G), key=len)
-        if len(largest) <= 2:  # Needs at least a certain size...
-            spectra.append([])
-        else:
-            # Compute the Chung's laplacian matrix of tribe's largest connected component
-            L = nx.directed_laplacian_matrix(G.subgraph(largest))
-
-            # Find the eigenvalues
-            eig = scipy.linalg.eig(L)[0]
-
-            # Order the non-zero eigenvalues and round to desired precision
-            spectrum = np.unique(np.round(eig[np.nonzero(eig)], precision))
-            spectra.append(spectrum)
-            
-    return spectra
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import progressbar
+from scipy import sparse
+from scipy.sparse import linalg as sparse_linalg
+
+from toposample.indexing import tribal_submatrices
+
+from eigenvalues import nonzero_spectrum
+from strong_components import largest_strong_component, is_aperiodic
+
+
+def directed_laplacian_matrix(adj_matrix):
+    """
+    Chung's Laplacian of a strongly connected directed graph, calculated as in networkx.directed_laplacian_matrix:
+    From the transition probability matrix P of the random walk on the graph (or of the lazy random walk if the graph
+    is periodic) and its Perron vector p: L = I - (Q + Q^T) / 2, where Q = diag(sqrt(p)) P diag(1 / sqrt(p))
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the graph. Must be strongly connected
+    :return: scipy.sparse.csr_matrix; symmetric
+    """
+    M = sparse.csr_matrix(adj_matrix, dtype=float)
+    n = M.shape[0]
+    P = sparse.diags(1.0 / np.array(M.sum(axis=1)).flatten()) @ M
+    if not is_aperiodic(M):
+        P = (sparse.identity(n) + P) / 2.0
+
+    # Perron vector: left eigenvector of P. ARPACK starts from a random vector unless one is given, and the round-off
+    # of the result (e.g. of the zero eigenvalue of L) would differ between runs
+    _, evecs = sparse_linalg.eigs(P.T, k=1, v0=np.ones(n))
+    v = evecs.flatten().real
+    sqrtp = np.sqrt(np.abs(v / v.sum()))
+    Q = sparse.diags(sqrtp) @ P @ sparse.diags(1.0 / sqrtp)
+    return sparse.csr_matrix(sparse.identity(n) - (Q + Q.T) / 2.0)
+
+
+def compute(tribes, adj_matrix, conv, precision, **spectrum_kwargs):
+
+    spectra = []
+    pbar = progressbar.ProgressBar(maxval=len(tribes))
+
+    for adj_submat in pbar(tribal_submatrices(tribes, adj_matrix, conv)):
+        # Find the largest connected component of the graph
+        largest = largest_strong_component(adj_submat)
+        if len(largest) <= 2:  # Needs at least a certain size...
+            spectra.append([])
+        else:
+            # Compute the Chung's laplacian matrix of tribe's largest connected component
+            L = directed_laplacian_matrix(adj_submat[np.ix_(largest, largest)])
+
+            # Find the non-zero eigenvalues. The matrix is symmetric
+            spectra.append(nonzero_spectrum(L, precision, symmetric=True, **spectrum_kwargs))
+
+    return spectra
@@ -13,9 +13,11 @@ You should have received a copy of the GNU Affero General Public License along w
 
 import numpy as np
 
+from toposample.indexing import tribal_chiefs
+
 
 def make_compute_degree(axis):
     def compute(tribes, adj_matrix, conv, precision):
-        return np.array(adj_matrix.sum(axis=axis)).flatten().tolist()
+        return np.array(adj_matrix.sum(axis=axis)).flatten()[tribal_chiefs(tribes)].tolist()
 
     return compute
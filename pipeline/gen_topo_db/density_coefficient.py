@@ -1,39 +1,41 @@
-"""
-toposampling - Topology-assisted sampling and analysis of activity data
-Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
-
-This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
-published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
-
-This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
-MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
-
-You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
-"""
-
-import numpy as np
-import progressbar
-from pyflagsercontain import flagser_count
-
-
-def compute(tribes, adj_matrix, conv, precision):
-
-    # Density coefficients
-    dcs = []
-    graph_size = adj_matrix.shape[0]
-    simplexcontainment = flagser_count(adj_matrix)
-    pbar = progressbar.ProgressBar()
-
-    # This assumes tribes are in the order of adjacency matrix indexing
-    for i in pbar(range(len(tribes))):
-        counts = simplexcontainment[i]
-
-        dc_list = []
-
-        for k in range(2, len(counts)):
-            parameter_at_k = k * counts[k] / ((k+1) * (graph_size-k) * counts[k-1]) if counts[k-1] != 0 else 0
-            dc_list.append(parameter_at_k)
-
-        dcs.append(dc_list)
-
-    return dcs
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+
+from toposample.indexing import tribal_chiefs
+
+from simplex_containment import simplex_containment
+
+
+# Simplices of all dimensions are needed. gen_topo_db counts the simplices of the entire circuit once, up to the largest
+# dimension any parameter needs, before calculating the parameters
+simplex_dimension = None
+
+
+def compute(tribes, adj_matrix, conv, precision):
+
+    # Density coefficients
+    graph_size = adj_matrix.shape[0]
+    # Simplex counts of the chiefs; one row per chief, padded with zeros beyond the largest simplex containing it
+    counts = simplex_containment(adj_matrix)[tribal_chiefs(tribes)]
+    n_dims = np.count_nonzero(counts, axis=1)
+
+    # Coefficients of all chiefs at each dimension k >= 2
+    k = np.arange(2, counts.shape[1])
+    numerators = k * counts[:, 2:]
+    denominators = (k + 1) * (graph_size - k) * counts[:, 1:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dc_values = np.where(denominators != 0, numerators / denominators, 0)
+
+    return [dc_values[i, :max(n_dims[i] - 2, 0)].tolist() for i in range(len(counts))]
@@ -0,0 +1,48 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import progressbar
+from scipy import sparse
+
+from toposample.indexing import tribal_membership
+
+
+def internal_sums(membership, matrix, chunk_size=256):
+    """
+    Sum of the entries of a matrix within each tribe, i.e. the diagonal of membership @ matrix @ membership.T.
+    Calculated for chunks of tribes at a time to bound the memory used.
+    :param membership: scipy.sparse.csr_matrix; membership matrix of the tribes, see tribal_membership
+    :param matrix: scipy.sparse matrix; of shape (number of neurons, number of neurons)
+    :param chunk_size: int; number of tribes to process at a time
+    :return: numpy.array; one sum per tribe
+    """
+    matrix = sparse.csr_matrix(matrix)
+    sums = np.zeros(membership.shape[0], dtype=np.result_type(matrix.dtype, membership.dtype))
+    pbar = progressbar.ProgressBar(maxval=membership.shape[0])
+    for start in pbar(range(0, membership.shape[0], chunk_size)):
+        chunk = membership[start:start + chunk_size]
+        sums[start:start + chunk_size] = np.array((chunk @ matrix).multiply(chunk).sum(axis=1)).flatten()
+    return sums
+
+
+def tribal_edge_sums(tribes, adj_matrix, conv, chunk_size=256):
+    """
+    :param tribes: Tribes or iterable of lists of gids
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+    :param conv: toposample.indexing.GidConverter
+    :param chunk_size: int; number of tribes to process at a time
+    :return: numpy.array; for each tribe the sum of the entries of its adjacency matrix, i.e. the number of
+    connections within the tribe if adj_matrix is boolean
+    """
+    return internal_sums(tribal_membership(tribes, adj_matrix, conv), adj_matrix, chunk_size=chunk_size)
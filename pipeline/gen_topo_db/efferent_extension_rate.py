@@ -11,31 +11,8 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General
 You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import numpy as np
-import progressbar
+from extension_rates import extension_rates
 
 
-def compute(tribes, adj_matrix, conv, precision):
-
-    extensions = []
-    pbar = progressbar.ProgressBar()
-
-    for tribe in pbar(tribes):
-        if len(tribe) == 1:
-            return 0
-        
-        tribe_ids = conv.indices(tribe)
-        extension_submat = adj_matrix[tribe_ids]
-
-        # Get all the neighbours of all the vertices in the tribe
-        all_neighbours = np.nonzero(np.sum(extension_submat, axis=0))[1]
-
-        # Remove tribe itself to get the extension rate
-        extension_rate = len(all_neighbours) - len(tribe)
-
-        # Something is funky if this trips
-        assert extension_rate >= 0
-
-        extensions.append(extension_rate)
-        
-    return extensions
+def compute(tribes, adj_matrix, conv, precision, chunk_size=256):
+    return extension_rates(tribes, adj_matrix, conv, chunk_size=chunk_size)[1]
@@ -0,0 +1,79 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import scipy.linalg
+from scipy import sparse
+from scipy.sparse import linalg as sparse_linalg
+
+# full: all eigenvalues, using a dense solver
+# largest: the k eigenvalues of largest magnitude, using a sparse solver
+# extremal: the k eigenvalues of largest magnitude and the k closest to zero, using a sparse solver
+MODES = ["full", "largest", "extremal"]
+
+
+def _to_dense(matrix):
+    if sparse.issparse(matrix):
+        return matrix.toarray()
+    return matrix
+
+
+def _partial_eigenvalues(matrix, k, extremal, symmetric, precision):
+    """
+    Eigenvalues of largest magnitude (and closest to zero) of a matrix. None if the sparse solver fails to find them.
+    """
+    matrix = sparse.csr_matrix(matrix, dtype=float)
+    solver = sparse_linalg.eigsh if symmetric else sparse_linalg.eigs
+    # ARPACK starts from a random vector unless one is given, and the results would differ in round-off between runs
+    v0 = np.ones(matrix.shape[0])
+    try:
+        eig = [solver(matrix, k=k, which="LM", v0=v0, return_eigenvectors=False)]
+        if extremal:
+            # Shift-invert slightly off zero, as the matrices are usually singular
+            near_zero = solver(matrix, k=k, sigma=10.0 ** -(precision + 1), which="LM", v0=v0,
+                               return_eigenvectors=False)
+            if not np.any(np.round(near_zero, precision)):
+                # All of them round to zero: the smallest non-zero eigenvalue could be any of the others
+                return None
+            eig.append(near_zero)
+    except RuntimeError:  # No convergence or exactly singular
+        return None
+    # Complex, as the eigenvalues from the dense solver, such that the type of a column does not depend on the mode
+    return np.hstack(eig).astype(complex)
+
+
+def nonzero_spectrum(matrix, precision, mode="full", k=6, dense_below=400, symmetric=False):
+    """
+    Sorted, unique non-zero eigenvalues of a matrix, rounded to the specified precision.
+    Downstream, spectra are usually reduced to their largest value, smallest non-zero value or the gap between the two
+    largest values (see toposample.db.lookup_functions). The partial modes calculate only the eigenvalues required for
+    that with a sparse (ARPACK) solver, such that time and memory scale with the number of non-zero entries instead of
+    the cube of the size. Matrices smaller than dense_below are always solved densely.
+    :param matrix: numpy.array or scipy.sparse matrix; square
+    :param precision: int; number of decimals to round to
+    :param mode: str; one of MODES. For "largest" only the lookups on the largest values remain meaningful.
+    :param k: int; number of eigenvalues at each end of the spectrum to calculate in the partial modes
+    :param dense_below: int; matrices of smaller size are solved using the dense solver in any mode
+    :param symmetric: bool; whether the matrix is symmetric, allowing a faster sparse solver
+    :return: numpy.array
+    """
+    assert mode in MODES, "Unknown spectrum mode: {0}".format(mode)
+    eig = None
+    n = matrix.shape[0]
+    if mode != "full" and n >= dense_below and k < n - 1:
+        eig = _partial_eigenvalues(matrix, k, mode == "extremal", symmetric, precision)
+    if eig is None:
+        eig = scipy.linalg.eig(_to_dense(matrix))[0]
+
+    # Order the non-zero eigenvalues and round to desired precision
+    return np.unique(np.round(eig[np.nonzero(eig)], precision))
@@ -11,22 +11,12 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General
 You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import numpy as np
-import progressbar
+import numpy
 
-import pyflagser
+from flagser_features import tribal_cell_counts
 
 
-def compute(tribes, adj_matrix, conv, precision):
-
-    ec = []
-    pbar = progressbar.ProgressBar()
-
-    for tribe in pbar(tribes):
-        # Convert from GIDs to local indexing
-        tribe_local_indices = conv.indices(tribe)
-
-        adj_submat = adj_matrix[np.ix_(tribe_local_indices, tribe_local_indices)]
-        ec.append(pyflagser.flagser_unweighted(adj_submat, directed=True)['euler'])
-
-    return ec
+def compute(tribes, adj_matrix, conv, precision, threads=None):
+    # Alternating sum of the numbers of simplices of each dimension
+    return [int(numpy.sum(cell_counts[::2]) - numpy.sum(cell_counts[1::2]))
+            for cell_counts in tribal_cell_counts(tribes, adj_matrix, conv, threads=threads)]
@@ -0,0 +1,64 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import progressbar
+from scipy import sparse
+
+from toposample.indexing import Tribes, tribal_membership
+
+
+def _calculate(tribes, adj_matrix, conv, chunk_size):
+    A = sparse.csr_matrix(adj_matrix, dtype=bool).astype(np.int32)
+    A.eliminate_zeros()
+    A_T = A.transpose().tocsr()
+    membership = tribal_membership(tribes, adj_matrix, conv)
+    n_afferent = np.zeros(membership.shape[0], dtype=int)
+    n_efferent = np.zeros(membership.shape[0], dtype=int)
+
+    pbar = progressbar.ProgressBar(maxval=membership.shape[0])
+    for start in pbar(range(0, membership.shape[0], chunk_size)):
+        chunk = membership[start:start + chunk_size]
+        # Entry (i, j) counts the connections from neuron j to (or from) members of tribe i
+        n_afferent[start:start + chunk_size] = (chunk @ A_T).getnnz(axis=1)
+        n_efferent[start:start + chunk_size] = (chunk @ A).getnnz(axis=1)
+
+    sizes = np.diff(membership.indptr)
+    extension_rates = []
+    for n_neighbours in [n_afferent, n_efferent]:
+        # Remove tribe itself to get the extension rate. Isolated neurons have an extension rate of 0
+        rates = np.where(sizes > 1, n_neighbours - sizes, 0)
+        # Something is funky if this trips
+        assert np.all(rates >= 0)
+        extension_rates.append(rates.tolist())
+    return tuple(extension_rates)
+
+
+def extension_rates(tribes, adj_matrix, conv, chunk_size=256):
+    """
+    Calculate the afferent and efferent extension rates of tribes, i.e. the number of neurons with connections to (or
+    from) any member of the tribe, minus the size of the tribe. Calculated in one pass for chunks of tribes at a time
+    from the products of their membership matrix with the adjacency matrix. For a Tribes object the results are
+    stored with it, such that both parameters share the pass.
+    :param tribes: Tribes or iterable of lists of gids
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+    :param conv: toposample.indexing.GidConverter
+    :param chunk_size: int; number of tribes to process at a time. Larger chunks need more memory
+    :return: tuple of lists; afferent and efferent extension rates of the tribes
+    """
+    if not isinstance(tribes, Tribes):
+        return _calculate(tribes, adj_matrix, conv, chunk_size)
+    derived = tribes.derived(adj_matrix)
+    if "extension_rates" not in derived:
+        derived["extension_rates"] = _calculate(tribes, adj_matrix, conv, chunk_size)
+    return derived["extension_rates"]
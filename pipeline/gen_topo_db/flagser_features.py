@@ -0,0 +1,90 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import progressbar
+
+import numpy
+import pyflagser
+from pyflagsercontain import flagser_count_subsets
+
+from toposample.indexing import Tribes, tribal_submatrices, tribal_membership
+
+import simplex_containment
+
+# Entries of the output of pyflagser.flagser_unweighted that parameters are calculated from
+FEATURES = ["betti", "euler", "cell_count"]
+
+
+def _run_flagser(tribes, adj_matrix, conv):
+    features = []
+    pbar = progressbar.ProgressBar(maxval=len(tribes))
+
+    for adj_submat in pbar(tribal_submatrices(tribes, adj_matrix, conv)):
+        res = pyflagser.flagser_unweighted(adj_submat, directed=True)
+        features.append(dict([(k, res[k]) for k in FEATURES]))
+    return features
+
+
+def flagser_features(tribes, adj_matrix, conv):
+    """
+    Run flagser once for each tribe. For a Tribes object the results are stored with it, such that all parameters
+    derived from them (Betti numbers, Euler characteristic, normalized Betti coefficient, ...) share a
+    single flagser pass.
+    :param tribes: Tribes or iterable of lists of gids
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+    :param conv: toposample.indexing.GidConverter
+    :return: list of dicts, one per tribe, with the entries listed in FEATURES
+    """
+    if not isinstance(tribes, Tribes):
+        return _run_flagser(tribes, adj_matrix, conv)
+    derived = tribes.derived(adj_matrix)
+    if "flagser" not in derived:
+        derived["flagser"] = _run_flagser(tribes, adj_matrix, conv)
+    return derived["flagser"]
+
+
+def _count_cells(tribes, adj_matrix, conv, threads):
+    if threads is None:
+        threads = simplex_containment.get_threads()
+    if isinstance(tribes, Tribes):
+        indptr, indices = tribes.indptr, tribes.indices
+    else:
+        membership = tribal_membership(tribes, adj_matrix, conv)
+        indptr, indices = membership.indptr, membership.indices
+    # One row per member of a tribe. Summed over the members of each tribe
+    containment = flagser_count_subsets(adj_matrix, indptr, indices, threads=threads)
+    cumulative = numpy.vstack([numpy.zeros((1, containment.shape[1]), dtype=containment.dtype),
+                               numpy.cumsum(containment, axis=0)])
+    per_tribe = cumulative[indptr[1:]] - cumulative[indptr[:-1]]
+    # Each k-simplex contains k + 1 vertices
+    per_tribe = per_tribe // numpy.arange(1, containment.shape[1] + 1)
+    return [_counts[:numpy.count_nonzero(_counts)] for _counts in per_tribe]
+
+
+def tribal_cell_counts(tribes, adj_matrix, conv, threads=None):
+    """
+    Number of directed simplices of each dimension in each tribe. Counted for all tribes in a single call to
+    pyflagsercontain, without calculating homology, i.e. much faster than flagser_features if Betti numbers are not
+    needed.
+    :param tribes: Tribes or iterable of lists of gids
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the neuron population
+    :param conv: toposample.indexing.GidConverter
+    :param threads: int; number of threads to count in. Default: as set by simplex_containment.set_threads
+    :return: list of numpy.arrays, one per tribe; entry k is the number of k-simplices in the tribe
+    """
+    if not isinstance(tribes, Tribes):
+        return _count_cells(tribes, adj_matrix, conv, threads)
+    derived = tribes.derived(adj_matrix)
+    if "cell_counts" not in derived:
+        derived["cell_counts"] = _count_cells(tribes, adj_matrix, conv, threads)
+    return derived["cell_counts"]
@@ -15,12 +15,22 @@ You should have received a copy of the GNU Affero General Public License along w
 import numpy
 import pandas as pd
 import os
+import sys
+import functools
 import importlib
+import multiprocessing
+import shutil
+import tempfile
+import progressbar
 
 from scipy import sparse
 
 from toposample import config
-from toposample.indexing import GidConverter
+from toposample.db import write_database, add_columns, read_manifest, write_manifest, read_index_and_columns
+from toposample.indexing import GidConverter, Tribes
+
+import simplex_containment
+import provenance
 
 
 def read_input(input_config):
@@ -31,7 +41,8 @@ def read_input(input_config):
 
 # noinspection PyPep8Naming
 def write_output(DB, output_fn):
-    DB.to_pickle(output_fn)
+    # Columnar format if output_fn ends in .h5, else pickled
+    write_database(DB, output_fn)
 
 
 def calculate_tribes(adj_matrix, neuron_info):
@@ -39,25 +50,9 @@ def calculate_tribes(adj_matrix, neuron_info):
     Calculate tribes, i.e. all neurons adjacent toa given neuron
     :param adj_matrix: scipy.sparse matrix - adjacency matrix of the neuron population
     :param neuron_info: pandas.DataFrame - additional neuron info; its _index_ will be used to identify tribal neurons
-    :return: pandas.DataFrame with a single column "tribe" that has the identifiers of tribal neurons
+    :return: toposample.indexing.Tribes - the tribes of all neurons, in the order of neuron_info
     """
-    converter = GidConverter(neuron_info)
-    tribes = []
-    tribal_db = pd.DataFrame(numpy.empty((len(neuron_info), 0)),
-                             index=neuron_info.index)
-
-    # Add transpose to get both in- and out-neighbors
-    M = adj_matrix.transpose() + adj_matrix
-    # Add diagonal such the each chief is part of its tribe
-    M[numpy.diag_indices_from(M)] = True
-    # Since we iterate rows, we want csr
-    if M.format != 'csr':
-        M = M.asformat('csr')
-
-    for m in M:
-        tribes.append(converter.gids(m.indices))
-    tribal_db["tribe"] = tribes
-    return tribal_db
+    return Tribes.from_adjacency(adj_matrix, neuron_info)
 
 
 # noinspection PyPep8Naming
@@ -78,9 +73,10 @@ def add_neuron_info(DB, neuron_info):
 def add_parameter_column(DB, tribes, parameter, topo_db_cfg, conv, adj_matrix):
     """
     Loop over the tribe parameters as specified, each loop makes a call to the associated
-    function computing the parameter values and injects into DB.
+    function computing the parameter values and injects into DB. Additional keyword arguments for the function can be
+    configured under "kwargs" in the entry of the parameter.
     :param DB: pandas.DataFrame - to put the results into
-    :param tribes: pandas.DataFrame - with a column "tribe" that holds gids of associated tribes. Can be the same as DB
+    :param tribes: toposample.indexing.Tribes - the tribes to calculate the parameter for
     :param parameter: str - parameter name
     :param topo_db_cfg: dict - configuration of the gen_topo_db step
     :param conv: GidConverter
@@ -93,20 +89,175 @@ def add_parameter_column(DB, tribes, parameter, topo_db_cfg, conv, adj_matrix):
     print("Calculating {0} for all tribes...".format(parameter))
     try:
         module = importlib.import_module(topo_db_cfg[parameter]["source"])
-        DB[topo_db_cfg[parameter]["column_name"]] = module.compute(tribes["tribe"], adj_matrix, conv, precision)
+        DB[topo_db_cfg[parameter]["column_name"]] = module.compute(tribes, adj_matrix, conv, precision,
+                                                                   **topo_db_cfg[parameter].get("kwargs", {}))
     except ImportError as e:
         print(e)
         print("Unable to load module for {0}".format(parameter))
 
 
-def create_db_with_specified_columns(lst_columns, tribes, neuron_info, topo_db_cfg, adj_matrix):
+def count_simplices_once(parameters, topo_db_cfg, adj_matrix):
+    """
+    Modules that look up the simplex containment of the entire circuit declare the largest dimension they need as
+    simplex_dimension (None: all dimensions). It is counted once for the largest of them, before any parameter is
+    calculated, such that all of them find the counts in the cache of simplex_containment.
+    :param parameters: list - names of the parameters to calculate
+    :param topo_db_cfg: dict - configuration of the gen_topo_db step
+    :param adj_matrix: scipy.sparse matrix - adjacency matrix of circuit
+    """
+    dimensions = []
+    for parameter in parameters:
+        try:
+            module = importlib.import_module(topo_db_cfg[parameter]["source"])
+        except ImportError:
+            continue
+        if hasattr(module, "simplex_dimension"):
+            dimensions.append(module.simplex_dimension)
+    if len(dimensions) > 0:
+        simplex_containment.simplex_containment(adj_matrix,
+                                                max_dimension=None if None in dimensions else max(dimensions))
+
+
+def share_with_workers(tribes, adj_matrix, shared_dir):
+    """
+    Write the index arrays of the adjacency matrix and the tribes into .npy files, such that worker processes can
+    memory map them read-only instead of each receiving its own copy.
+    :param tribes: toposample.indexing.Tribes - the tribes of all neurons
+    :param adj_matrix: scipy.sparse matrix - adjacency matrix of circuit
+    :param shared_dir: str - directory to write the files into
+    :return: tuple - format and shape of the shared adjacency matrix
+    """
+    if adj_matrix.format not in ("csr", "csc"):
+        adj_matrix = adj_matrix.tocsr()
+    if not adj_matrix.has_sorted_indices:
+        # Workers cannot sort the read-only arrays in place
+        adj_matrix = adj_matrix.sorted_indices()
+    arrays = {"data": adj_matrix.data, "indices": adj_matrix.indices, "indptr": adj_matrix.indptr,
+              "tribe_indptr": tribes.indptr, "tribe_indices": tribes.indices, "tribe_chiefs": tribes.chiefs,
+              "gids": tribes.population_gids}
+    for name, arr in arrays.items():
+        numpy.save(os.path.join(shared_dir, name + ".npy"), arr)
+    return adj_matrix.format, adj_matrix.shape
+
+
+_worker_state = {}
+
+
+def _initialize_worker(shared_dir, adj_format, adj_shape, conv, cache_dir):
+    def load(name):
+        return numpy.load(os.path.join(shared_dir, name + ".npy"), mmap_mode="r")
+    matrix_class = {"csr": sparse.csr_matrix, "csc": sparse.csc_matrix}[adj_format]
+    _worker_state["adj_matrix"] = matrix_class((load("data"), load("indices"), load("indptr")),
+                                               shape=adj_shape, copy=False)
+    _worker_state["tribes"] = Tribes(load("tribe_indptr"), load("tribe_indices"), load("gids"),
+                                     chiefs=load("tribe_chiefs"))
+    _worker_state["conv"] = conv
+    simplex_containment.set_cache_dir(cache_dir)
+    # The workers already run in parallel: each counts simplices in a single thread
+    simplex_containment.set_threads(1)
+    # Progress is reported by the parent process. The progress bars of the modules write to stderr, which is kept for
+    # warnings, so they are pointed at the null device instead
+    devnull = open(os.devnull, "w")
+    sys.stdout = devnull
+    progressbar.ProgressBar = functools.partial(progressbar.ProgressBar, fd=devnull)
+
+
+def _compute_chunk(task):
+    """
+    Calculate a number of parameters for a contiguous range of tribes. Runs in a worker process.
+    :param task: tuple - (task id, first tribe, end of the range of tribes, list of (parameter, module name, kwargs),
+    precision)
+    :return: tuple - (task id, dict of lists of parameter values, one list per parameter)
+    """
+    task_id, start, stop, sources, precision = task
+    # All parameters are calculated on the same slice, such that they share its cached submatrices
+    tribes = _worker_state["tribes"][start:stop]
+    results = {}
+    for parameter, source, kwargs in sources:
+        module = importlib.import_module(source)
+        results[parameter] = list(module.compute(tribes, _worker_state["adj_matrix"], _worker_state["conv"],
+                                                 precision, **kwargs))
+    return task_id, results
+
+
+def calculate_parameters_in_parallel(parameters, tribes, topo_db_cfg, conv, adj_matrix, workers,
+                                     chunks_per_worker=8):
+    """
+    Calculate a number of tribe parameters in a pool of worker processes. The tribes are split into contiguous chunks
+    and each task calculates all parameters for one chunk. Parameters whose module declares shardable = False (because
+    it works on the entire circuit) are calculated for all tribes in a single task. If a module has a function
+    prepare(adj_matrix), it is called once before the pool is started, e.g. to fill a cache that all tasks read from.
+    The results are identical to calculating the parameters one after another in a single process.
+    :param parameters: list - names of the parameters to calculate
+    :param tribes: toposample.indexing.Tribes - the tribes of all neurons
+    :param topo_db_cfg: dict - configuration of the gen_topo_db step
+    :param conv: GidConverter
+    :param adj_matrix: scipy.sparse matrix - adjacency matrix of circuit
+    :param workers: int - number of worker processes
+    :param chunks_per_worker: int - number of chunks of tribes per worker. More chunks balance the load better.
+    :return: dict - for each parameter that could be calculated the list of its values for all tribes
+    """
+    precision = topo_db_cfg["precision"]
+    shardable, unshardable = [], []
+    for parameter in parameters:
+        assert parameter in topo_db_cfg["parameters"], "Parameter {0} not in config!".format(parameter)
+        try:
+            module = importlib.import_module(topo_db_cfg[parameter]["source"])
+        except ImportError as e:
+            print(e)
+            print("Unable to load module for {0}".format(parameter))
+            continue
+        source = (parameter, topo_db_cfg[parameter]["source"], topo_db_cfg[parameter].get("kwargs", {}))
+        if getattr(module, "shardable", True):
+            shardable.append(source)
+        else:
+            unshardable.append(source)
+        if hasattr(module, "prepare"):
+            module.prepare(adj_matrix)
+
+    # Whole-circuit tasks first, as they take longest
+    ranges = [(0, len(tribes), [source]) for source in unshardable]
+    if len(shardable) > 0:
+        bounds = numpy.linspace(0, len(tribes), min(workers * chunks_per_worker, len(tribes)) + 1).astype(int)
+        ranges.extend([(start, stop, shardable) for start, stop in zip(bounds[:-1], bounds[1:])])
+    tasks = [(i, start, stop, sources, precision) for i, (start, stop, sources) in enumerate(ranges)]
+
+    print("Calculating {0} for all tribes using {1} workers...".format(
+        ", ".join([_src[0] for _src in unshardable + shardable]), workers))
+    shared_dir = tempfile.mkdtemp()
+    try:
+        adj_format, adj_shape = share_with_workers(tribes, adj_matrix, shared_dir)
+        pool = multiprocessing.Pool(workers, initializer=_initialize_worker,
+                                    initargs=(shared_dir, adj_format, adj_shape, conv,
+                                              simplex_containment.get_cache_dir()))
+        try:
+            chunk_results = [None] * len(tasks)
+            pbar = progressbar.ProgressBar(maxval=len(tasks))
+            for task_id, results in pbar(pool.imap_unordered(_compute_chunk, tasks)):
+                chunk_results[task_id] = results
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        shutil.rmtree(shared_dir)
+
+    # Concatenate the chunks of each parameter in the order of the tribes
+    columns = {}
+    for (start, stop, sources), results in zip(ranges, chunk_results):
+        for parameter, _, _ in sources:
+            columns.setdefault(parameter, []).extend(results[parameter])
+    return columns
+
+
+def create_db_with_specified_columns(lst_columns, tribes, neuron_info, topo_db_cfg, adj_matrix, workers=1):
     """
     Create a topological database with specified parameters
     :param lst_columns: list - list of parameters to populate the DB with
-    :param tribes: pandas.DataFrame - with a column "tribe" that has gids of neurons of the associated tribe
+    :param tribes: toposample.indexing.Tribes - the tribes of all neurons
     :param neuron_info: pandas.DataFrame - with additional info about the neurons
     :param topo_db_cfg: dict - configuration of the gen_topo_db step
     :param adj_matrix: scipy.sparse.csr_matrix - adjacency matrix of circuit
+    :param workers: int - number of worker processes to calculate the parameters in. Default: 1, i.e. no pool
     :return: pandas.DataFrame holding all specified parameters in the columns
     """
     import_root = os.path.split(__file__)[0]
@@ -118,18 +269,75 @@ def create_db_with_specified_columns(lst_columns, tribes, neuron_info, topo_db_c
     # Note: This assumes that the order in neuron_info and the adj_matrix are the same!
     DB.index = neuron_info.index
     conv = GidConverter(neuron_info)
+    count_simplices_once([_col for _col in lst_columns if _col not in ("tribe", "neuron_info")], topo_db_cfg,
+                         adj_matrix)
+
+    if workers > 1:
+        parameter_columns = calculate_parameters_in_parallel([_col for _col in lst_columns
+                                                              if _col not in ("tribe", "neuron_info")],
+                                                             tribes, topo_db_cfg, conv, adj_matrix, workers)
 
     for column_name in lst_columns:
         if column_name == "tribe":
-            DB["tribe"] = tribes["tribe"]
+            DB["tribe"] = tribes.to_series(index=DB.index)
         elif column_name == "neuron_info":
             add_neuron_info(DB, neuron_info)
+        elif workers > 1:
+            if column_name in parameter_columns:
+                DB[topo_db_cfg[column_name]["column_name"]] = parameter_columns[column_name]
         else:
             add_parameter_column(DB, tribes, column_name, topo_db_cfg, conv, adj_matrix)
     return DB
 
 
-def main(path_to_config, parameter_name=None):
+def update_database(out_fn, parameters, tribes, neuron_info, topo_db_cfg, adj_matrix, workers=1, force=False):
+    """
+    Create a topological database, or bring an existing one up to date. The database carries a manifest of what each
+    column was calculated from: the adjacency matrix, neuron_info, the source code of the module calculating it, the
+    precision and its kwargs. Only parameters where any of that changed, or whose columns are missing, are calculated.
+    :param out_fn: str - path of the database
+    :param parameters: list - parameters to populate the DB with, including "tribe" and "neuron_info"
+    :param tribes: toposample.indexing.Tribes - the tribes of all neurons
+    :param neuron_info: pandas.DataFrame - with additional info about the neurons
+    :param topo_db_cfg: dict - configuration of the gen_topo_db step
+    :param adj_matrix: scipy.sparse.csr_matrix - adjacency matrix of circuit
+    :param workers: int - number of worker processes to calculate the parameters in
+    :param force: bool - if True, calculate all parameters, even if they are up to date
+    :return: None - writes to out_fn
+    """
+    adj_hash = simplex_containment.adjacency_hash(adj_matrix)
+    current = dict([(_param, provenance.column_provenance(_param, topo_db_cfg, adj_hash, neuron_info))
+                    for _param in parameters])
+
+    if force or not os.path.isfile(out_fn):
+        outdated = list(parameters)
+        manifest = {}
+    else:
+        manifest = read_manifest(out_fn)
+        index, columns = read_index_and_columns(out_fn)
+        outdated = provenance.outdated_parameters(current, manifest, index, columns, neuron_info.index)
+    if len(outdated) == 0:
+        print("All columns of {0} are up to date".format(out_fn))
+        return
+    if len(outdated) < len(parameters):
+        print("Up to date: {0}".format(", ".join([_p for _p in parameters if _p not in outdated])))
+
+    DB = create_db_with_specified_columns(outdated, tribes, neuron_info, topo_db_cfg, adj_matrix, workers=workers)
+    if len(outdated) == len(parameters):
+        # Write from scratch. This drops columns that are no longer configured
+        write_output(DB, out_fn)
+        manifest = {}
+    else:
+        add_columns(out_fn, DB)
+    for parameter in outdated:
+        if current[parameter] is not None and all([_col in DB for _col in current[parameter]["columns"]]):
+            manifest[parameter] = current[parameter]
+        else:
+            manifest.pop(parameter, None)
+    write_manifest(out_fn, manifest)
+
+
+def main(path_to_config, parameter_name=None, workers=1, force=False):
     # Read the meta-config file
     cfg = config.Config(path_to_config)
 
@@ -140,29 +348,34 @@ def main(path_to_config, parameter_name=None):
     adj_matrix, neuron_info = read_input(stage["inputs"])
     assert adj_matrix.shape[0] == len(neuron_info), "Neuron info and adjacency matrix have incompatible sizes!"
     topo_db_cfg = stage["config"]
+    # Counts of simplices in the circuit are expensive. Keep them to be shared between runs and parameters
+    simplex_containment.set_cache_dir(stage["other"])
     # Calculate tribes, i.e. gids of adjacent neurons
     tribes = calculate_tribes(adj_matrix, neuron_info)
 
     # Populate DB
     if parameter_name is None:  # Case 1: generate all columns at once
-        DB = create_db_with_specified_columns(["tribe", "neuron_info"] + topo_db_cfg["parameters"],
-                                              tribes, neuron_info, topo_db_cfg, adj_matrix)
         # Write output to where it's meant to go
-        write_output(DB, stage["outputs"]["database"])
+        update_database(stage["outputs"]["database"], ["tribe", "neuron_info"] + topo_db_cfg["parameters"],
+                        tribes, neuron_info, topo_db_cfg, adj_matrix, workers=workers, force=force)
     else:  # Case 2: Generate one single column at a time
-        DB = create_db_with_specified_columns([parameter_name], tribes, neuron_info, topo_db_cfg, adj_matrix)
         suffix = "." + parameter_name.lower().replace(" ", "_")  # Use parameter name as suffix for output file
         # Write output to the 'other' directory for later merging
         if not os.path.exists(stage["other"]):
             os.makedirs(stage["other"])
         out_fn = os.path.join(stage["other"], os.path.split(stage["outputs"]["database"])[1]) + suffix
-        write_output(DB, out_fn)
+        update_database(out_fn, [parameter_name], tribes, neuron_info, topo_db_cfg, adj_matrix,
+                        workers=workers, force=force)
 
 
 if __name__ == "__main__":
-    import sys
+    import getopt
 
-    if len(sys.argv) > 2:
-        main(sys.argv[1], parameter_name=sys.argv[2])
+    opts, args = getopt.getopt(sys.argv[1:], "w:f", ["workers=", "force"])
+    opts = dict(opts)
+    n_workers = int(opts.get("--workers", opts.get("-w", 1)))
+    force_all = "-f" in opts or "--force" in opts
+    if len(args) > 1:
+        main(args[0], parameter_name=args[1], workers=n_workers, force=force_all)
     else:
-        main(sys.argv[1])
+        main(args[0], workers=n_workers, force=force_all)
@@ -11,11 +11,15 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General
 You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import numpy
 import pandas
 import os
+import progressbar
 
 
 from toposample import Config
+from toposample.db import read_database, write_database, add_columns, is_columnar
+from toposample.db import read_manifest, write_manifest, remove_database
 
 
 def find_files(stage):
@@ -31,21 +35,67 @@ def find_files(stage):
     return file_list
 
 
+def merge_in_memory(files, fn_out, delete_inputs=False):
+    DB_raw = [read_database(_fn) for _fn in files]
+    DB = pandas.concat(DB_raw, axis=1)
+    # The provenance of the columns, as recorded by gen_topo_db for the individual files
+    manifest = {}
+    for _fn in files:
+        manifest.update(read_manifest(_fn))
+    write_database(DB, fn_out)
+    write_manifest(fn_out, manifest)
+    if delete_inputs:
+        for fn in files:
+            remove_database(fn)
+
+
+def merge_streaming(files, fn_out, delete_inputs=False):
+    """
+    Merge the individual files into a database in the columnar format, one file at a time. Only the file currently
+    merged is held in memory (plus the index of the output), i.e. usually a single column.
+    :param files: list; paths to the databases to merge, each holding one or more columns
+    :param fn_out: str; path of the merged database. Must be in the columnar format (see toposample.db.is_columnar)
+    :param delete_inputs: bool; delete each input file as soon as it has been merged
+    """
+    assert is_columnar(fn_out), "Streaming merge needs a database in the columnar format!"
+    index = None
+    merged_columns = []
+    manifest = {}
+    pbar = progressbar.ProgressBar(maxval=len(files))
+    for fn in pbar(files):
+        DB = read_database(fn)
+        duplicates = [_col for _col in DB.columns if _col in merged_columns]
+        if len(duplicates) > 0:
+            raise Exception("Duplicate column(s) {0} in {1}!".format(", ".join(duplicates), fn))
+        if index is None:
+            write_database(DB, fn_out)
+            index = DB.index
+        else:
+            if len(DB.index) != len(index) or not numpy.all(DB.index.values == index.values):
+                raise Exception("Index of {0} does not match the index of {1}!".format(fn, files[0]))
+            add_columns(fn_out, DB)
+        merged_columns.extend(DB.columns)
+        # Keep the manifest in line with the columns written so far, such that a partial merge is consistent
+        manifest.update(read_manifest(fn))
+        write_manifest(fn_out, manifest)
+        del DB
+        if delete_inputs:
+            remove_database(fn)
+
+
 def main(cfg_fn, delete_inputs=False):
     cfg = Config(cfg_fn)
     stage = cfg.stage("gen_topo_db")
     files = find_files(stage)
     if len(files) == 0:
         return
-    DB_raw = [pandas.read_pickle(_fn) for _fn in files]
-    DB = pandas.concat(DB_raw, axis=1)
     fn_out = stage["outputs"]["database"]
     if not os.path.isdir(os.path.split(fn_out)[0]):
         os.makedirs(os.path.split(fn_out)[0])
-    pandas.to_pickle(DB, fn_out)
-    if delete_inputs:
-        for fn in files:
-            os.remove(fn)
+    if is_columnar(fn_out):
+        merge_streaming(files, fn_out, delete_inputs=delete_inputs)
+    else:  # A pickled DataFrame cannot be written column by column
+        merge_in_memory(files, fn_out, delete_inputs=delete_inputs)
 
 
 if __name__ == "__main__":
@@ -11,19 +11,8 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General
 You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import numpy as np
-import progressbar
+from edge_counts import tribal_edge_sums
 
 
-def compute(tribes, adj_matrix, conv, precision):
-
-    N = []
-    pbar = progressbar.ProgressBar()
-
-    for tribe in pbar(tribes):
-        # Convert from GIDs to local indexing
-        tribe_local_indices = conv.indices(tribe)
-
-        adj_submat = adj_matrix[np.ix_(tribe_local_indices, tribe_local_indices)]
-        N.append(adj_submat.sum())
-    return N
+def compute(tribes, adj_matrix, conv, precision, chunk_size=256):
+    return tribal_edge_sums(tribes, adj_matrix, conv, chunk_size=chunk_size).tolist()
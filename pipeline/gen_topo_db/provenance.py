@@ -0,0 +1,109 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import types
+import hashlib
+import importlib
+import numpy
+import pandas
+
+
+def neuron_info_hash(neuron_info, index_only=False):
+    """
+    :param neuron_info: pandas.DataFrame; additional neuron info, indexed by gid
+    :param index_only: bool; if True, only the gids (and their order) are hashed
+    :return: str; content hash of neuron_info
+    """
+    h = hashlib.sha1()
+    h.update(pandas.util.hash_pandas_object(neuron_info.index).values.tobytes())
+    if not index_only:
+        h.update(str(list(neuron_info.columns)).encode())
+        h.update(pandas.util.hash_pandas_object(neuron_info, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def source_hash(module):
+    """
+    :param module: module calculating a parameter
+    :return: str; hash of the source code of the module and of all modules in the same directory that it uses, e.g.
+    the source code of eigenvalues.py for the spectrum parameters
+    """
+    root = os.path.split(os.path.abspath(module.__file__))[0]
+    sources = {}
+
+    def collect(mod):
+        fn = getattr(mod, "__file__", None)
+        if fn is None or mod.__name__ in sources or os.path.split(os.path.abspath(fn))[0] != root:
+            return
+        with open(fn, "rb") as fid:
+            sources[mod.__name__] = fid.read()
+        for v in vars(mod).values():
+            if isinstance(v, types.ModuleType):
+                collect(v)
+            elif isinstance(getattr(v, "__module__", None), str) and v.__module__ in sys.modules:
+                collect(sys.modules[v.__module__])
+
+    collect(module)
+    h = hashlib.sha1()
+    for name in sorted(sources.keys()):
+        h.update(name.encode())
+        h.update(sources[name])
+    return h.hexdigest()
+
+
+def column_provenance(parameter, topo_db_cfg, adj_hash, neuron_info):
+    """
+    Everything the columns of a parameter depend on. If any of it changes, the parameter has to be calculated again.
+    :param parameter: str; name of the parameter, or "tribe" or "neuron_info"
+    :param topo_db_cfg: dict; configuration of the gen_topo_db step
+    :param adj_hash: str; hash of the adjacency matrix (see simplex_containment.adjacency_hash)
+    :param neuron_info: pandas.DataFrame; additional neuron info, indexed by gid
+    :return: dict; json serializable. None if the module calculating the parameter cannot be loaded
+    """
+    if parameter == "neuron_info":
+        return {"columns": list(neuron_info.columns), "neuron_info": neuron_info_hash(neuron_info)}
+    provenance = {"adjacency": adj_hash, "neuron_info": neuron_info_hash(neuron_info, index_only=True)}
+    if parameter == "tribe":
+        provenance["columns"] = ["tribe"]
+        return provenance
+    try:
+        module = importlib.import_module(topo_db_cfg[parameter]["source"])
+    except ImportError:
+        return None
+    provenance.update({"columns": [topo_db_cfg[parameter]["column_name"]],
+                       "source": topo_db_cfg[parameter]["source"],
+                       "source_hash": source_hash(module),
+                       "precision": topo_db_cfg["precision"],
+                       "kwargs": topo_db_cfg[parameter].get("kwargs", {})})
+    return provenance
+
+
+def outdated_parameters(provenance, manifest, index, columns, expected_index):
+    """
+    :param provenance: dict; for each parameter its current provenance (see column_provenance)
+    :param manifest: dict; for each parameter the provenance of its columns in an existing database
+    :param index: pandas.Index; index of the existing database
+    :param columns: list; names of the columns in the existing database
+    :param expected_index: pandas.Index; gids of the neurons
+    :return: list; names of the parameters that have to be calculated (again), in the order of provenance. All of them
+    if the index of the existing database does not match.
+    """
+    if len(index) != len(expected_index) or not numpy.all(index.values == expected_index.values):
+        return list(provenance.keys())
+    outdated = []
+    for parameter, prov in provenance.items():
+        if manifest.get(parameter, None) != prov or not all([_col in columns for _col in prov["columns"]]):
+            outdated.append(parameter)
+    return outdated
@@ -12,29 +12,31 @@ You should have received a copy of the GNU Affero General Public License along w
 """
 
 import numpy as np
-import progressbar
+from scipy import sparse
 
+from toposample.indexing import tribal_membership
 
-def compute(tribes, adj_matrix, conv, precision):
-    import networkx as nx
+from edge_counts import internal_sums
 
-    rel_boundaries = []
-    pbar = progressbar.ProgressBar()
-    G_full = nx.from_scipy_sparse_matrix(adj_matrix)
 
-    for tribe in pbar(tribes):
-        # Convert from GIDs to local indexing
-        tribe_local_indices = conv.indices(tribe)
+def compute(tribes, adj_matrix, conv, precision, chunk_size=256):
+    """
+    The relative boundary of a tribe is the number of pairs of a member and a non-member that are connected (in either
+    direction), divided by the number of connections within the tribe. Both are calculated for chunks of tribes at a
+    time from the products of their membership matrix with the adjacency matrix.
+    """
+    A = sparse.csr_matrix(adj_matrix, dtype=bool).astype(np.int32)
+    # Undirected adjacency, i.e. neurons connected in either direction
+    S = (A + A.transpose()).astype(bool).astype(np.int32).tocsr()
+    membership = tribal_membership(tribes, adj_matrix, conv)
+    # Pairs of a member with any neuron, minus pairs of two members
+    boundaries = membership @ np.array(S.sum(axis=1)).flatten() - internal_sums(membership, S, chunk_size=chunk_size)
+    edges_in_tribes = internal_sums(membership, A, chunk_size=chunk_size)
 
-        adj_submat = adj_matrix[np.ix_(tribe_local_indices, tribe_local_indices)]
-        G = nx.from_scipy_sparse_matrix(adj_submat, create_using=nx.DiGraph)
-        edges_in_tribe = G.number_of_edges()
+    rel_boundaries = []
+    for boundary, edges_in_tribe in zip(boundaries, edges_in_tribes):
         if edges_in_tribe == 0:
             rel_boundaries.append(0)
         else:
-            # Get the edge boundary of a tribe within the full circuit
-            boundary = nx.algorithms.boundary.edge_boundary(G_full, tribe_local_indices)
-
-            rel_boundaries.append(np.round(len(list(boundary)) / edges_in_tribe, precision))
-
+            rel_boundaries.append(np.round(boundary / edges_in_tribe, precision))
     return rel_boundaries
@@ -0,0 +1,163 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import re
+import glob
+import hashlib
+import numpy
+
+from pyflagsercontain import flagser_count, DEFAULT_THREADS
+
+# Directory that results are written to and read from. None: results are only kept in memory
+_cache_dir = None
+# Results for the adjacency matrix used last, by content hash and maximal dimension (None: all dimensions)
+_memory = {}
+# The adjacency matrix hashed last and its hash
+_last_hashed = (None, None)
+# Number of threads that pyflagsercontain counts in
+_threads = DEFAULT_THREADS
+
+
+def set_cache_dir(path):
+    """
+    Set the directory to keep the simplex containment of adjacency matrices in. gen_topo_db sets it to the 'other'
+    directory of its stage, such that subsequent runs (including runs for individual parameters) load the counts
+    instead of calculating them again.
+    :param path: str or None; None to only keep the results in memory
+    """
+    global _cache_dir
+    _cache_dir = path
+    if path is not None and not os.path.exists(path):
+        os.makedirs(path)
+
+
+def get_cache_dir():
+    return _cache_dir
+
+
+def set_threads(threads):
+    """
+    Set the number of threads that simplices are counted in by pyflagsercontain, here and in flagser_features.
+    gen_topo_db sets it to 1 in its worker processes, which already run in parallel.
+    :param threads: int
+    """
+    global _threads
+    _threads = max(int(threads), 1)
+
+
+def get_threads():
+    return _threads
+
+
+def clear_memory():
+    """Forget the results kept in memory, such that the next call counts again (or loads from the cache directory)"""
+    global _last_hashed
+    _memory.clear()
+    _last_hashed = (None, None)
+
+
+def adjacency_hash(adj_matrix):
+    """
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of a graph
+    :return: str; content hash of the graph, i.e. of the locations of the non-zero entries of adj_matrix. Does not
+    depend on the sparse format or dtype of the matrix.
+    """
+    global _last_hashed
+    if _last_hashed[0] is adj_matrix:
+        return _last_hashed[1]
+    A = adj_matrix.tocsr().astype(bool)
+    A.eliminate_zeros()
+    if not A.has_sorted_indices:
+        A.sort_indices()
+    h = hashlib.sha1()
+    for arr in [numpy.array(A.shape), A.indptr, A.indices]:
+        h.update(arr.astype(numpy.int64).tobytes())
+    _last_hashed = (adj_matrix, h.hexdigest())
+    return _last_hashed[1]
+
+
+def _cache_file(key, max_dimension=None):
+    if max_dimension is None:
+        return os.path.join(_cache_dir, "simplex_containment_{0}.npz".format(key))
+    return os.path.join(_cache_dir, "simplex_containment_{0}_dim{1}.npz".format(key, max_dimension))
+
+
+def _cached_dimensions(key):
+    """Maximal dimensions of the results in the cache directory, None for results of all dimensions"""
+    dimensions = [None] if os.path.isfile(_cache_file(key)) else []
+    for fn in glob.glob(os.path.join(_cache_dir, "simplex_containment_{0}_dim*.npz".format(key))):
+        match = re.match(r"simplex_containment_{0}_dim(\d+)\.npz$".format(key), os.path.split(fn)[1])
+        if match is not None:
+            dimensions.append(int(match.group(1)))
+    return dimensions
+
+
+def _best_dimension(dimensions, max_dimension):
+    """Of the maximal dimensions of some results, the smallest that includes max_dimension (None: all dimensions)"""
+    covering = [_dim for _dim in dimensions if _dim is None or (max_dimension is not None and _dim >= max_dimension)]
+    if len(covering) == 0:
+        return False
+    return min(covering, key=lambda _dim: numpy.inf if _dim is None else _dim)
+
+
+def _find(key, max_dimension):
+    """
+    Look up results (in memory, then in the cache directory) that include all dimensions up to max_dimension. Of
+    several, those with the fewest dimensions are used.
+    """
+    dim = _best_dimension([_dim for _key, _dim in _memory.keys() if _key == key], max_dimension)
+    if dim is not False:
+        return _memory[(key, dim)]
+    if _cache_dir is not None:
+        dim = _best_dimension(_cached_dimensions(key), max_dimension)
+        if dim is not False:
+            return _load(_cache_file(key, dim))
+    return None
+
+
+def _save(containment, fn):
+    # Write to a temporary file first, such that concurrent readers never see an incomplete file
+    tmp_fn = fn + ".{0}.tmp".format(os.getpid())
+    with open(tmp_fn, "wb") as fid:
+        numpy.savez(fid, containment=containment)
+    os.replace(tmp_fn, fn)
+
+
+def _load(fn):
+    with numpy.load(fn) as data:
+        return data["containment"]
+
+
+def simplex_containment(adj_matrix, max_dimension=None):
+    """
+    Number of directed simplices of each dimension that each vertex of a graph is part of, as calculated by
+    pyflagsercontain.flagser_count. Calculated once per graph, then loaded from the cache.
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the graph
+    :param max_dimension: int; only simplices up to this dimension are needed, which is much faster to count for large
+    graphs. Default: all dimensions. Results for all dimensions are used if already available.
+    :return: numpy.array of shape (number of vertices, number of dimensions); entry (i, k) is the number of k-simplices
+    containing vertex i
+    """
+    key = adjacency_hash(adj_matrix)
+    containment = _find(key, max_dimension)
+    if containment is None:
+        containment = flagser_count(adj_matrix, threads=_threads, max_dimension=max_dimension)
+        if _cache_dir is not None:
+            _save(containment, _cache_file(key, max_dimension))
+    if len([_key for _key, _dim in _memory.keys() if _key != key]) > 0:
+        _memory.clear()
+    _memory[(key, max_dimension)] = containment
+    if max_dimension is not None:
+        containment = containment[:, :max_dimension + 1]
+    return containment
@@ -0,0 +1,40 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+from scipy.sparse import csgraph
+
+
+def largest_strong_component(adj_matrix):
+    """
+    Find the largest strongly connected component of a directed graph. Of several components of that size, the one
+    completed first by the depth-first search is returned, same as max(networkx.strongly_connected_components(G),
+    key=len).
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the graph
+    :return: numpy.array; sorted indices of the vertices in the component
+    """
+    _, labels = csgraph.connected_components(adj_matrix, directed=True, connection="strong")
+    return np.nonzero(labels == np.argmax(np.bincount(labels)))[0]
+
+
+def is_aperiodic(adj_matrix):
+    """
+    Whether a strongly connected directed graph is aperiodic, i.e. the greatest common divisor of the lengths of its
+    cycles is 1. Same as networkx.is_aperiodic: the period is the gcd of level(u) + 1 - level(v) over all edges (u, v),
+    where level is the breadth-first distance from an arbitrary vertex.
+    :param adj_matrix: scipy.sparse matrix; adjacency matrix of the graph. Must be strongly connected
+    :return: bool
+    """
+    levels = csgraph.shortest_path(adj_matrix, directed=True, unweighted=True, indices=0).astype(int)
+    rows, cols = adj_matrix.nonzero()
+    return np.gcd.reduce(levels[rows] + 1 - levels[cols]) == 1
@@ -12,33 +12,35 @@ You should have received a copy of the GNU Affero General Public License along w
 """
 
 import numpy as np
-import progressbar
-from pyflagsercontain import flagser_count
+
+from toposample.indexing import tribal_chiefs
+
+from simplex_containment import simplex_containment
+
+
+# Only 2-simplices are needed. gen_topo_db counts the simplices of the entire circuit once, up to the largest dimension
+# any parameter needs, before calculating the parameters
+simplex_dimension = 2
 
 
 def compute(tribes, adj_matrix, conv, precision):
 
     # Transitive clustering coefficients of chiefs
-    trccs = []
-
-    simplexcontainment = flagser_count(adj_matrix)
+    chiefs = tribal_chiefs(tribes)
+    simplexcontainment = simplex_containment(adj_matrix, max_dimension=simplex_dimension)
     indegs = np.array(adj_matrix.sum(axis=0))[0]
     outdegs = np.array(adj_matrix.sum(axis=1))[:, 0]
     totdegs = np.array((adj_matrix + adj_matrix.transpose()).sum(axis=0))[0]
     recip_degs = indegs + outdegs - totdegs
 
-    # This assumes tribes are in the order of adjacency matrix indexing
-    pbar = progressbar.ProgressBar(maxval=len(indegs))
-    for indeg, outdeg, totdeg, recip_deg, smplxcont in pbar(zip(indegs, outdegs,
-                                                                totdegs, recip_degs,
-                                                                simplexcontainment)):
-        denom = totdeg*(totdeg-1)-(indeg*outdeg+recip_deg)
-
-        if denom != 0 and len(smplxcont) > 2:
-            # smplxcont[i][2] gives the number of directed 2-cliques that vertex i belongs to
-            parameter = np.round(smplxcont[2] / denom, precision)
-        else:
-            parameter = 0
-        trccs.append(parameter)
-
-    return trccs
+    denoms = totdegs[chiefs] * (totdegs[chiefs] - 1) - (indegs[chiefs] * outdegs[chiefs] + recip_degs[chiefs])
+    # Column 2 gives the number of directed 2-cliques that each vertex belongs to
+    if simplexcontainment.shape[1] > 2:
+        two_cliques = simplexcontainment[chiefs, 2]
+    else:
+        two_cliques = np.zeros(len(chiefs), dtype=int)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trccs = np.where(denoms != 0, np.round(two_cliques / denoms, precision), 0)
+
+    return trccs.tolist()
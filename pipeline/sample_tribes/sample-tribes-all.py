@@ -0,0 +1,105 @@
+"""
+toposampling - Topology-assisted sampling and analysis of activity data
+Copyright (C) 2020 Blue Brain Project / EPFL & University of Aberdeen
+
+This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import importlib
+
+from multiprocessing.pool import ThreadPool
+
+from toposample import config
+from toposample.data import update_tribes
+from toposample.db import read_database
+
+# Sampling strategies, by their name in the sampling config, and the scripts implementing them. Their output is merged
+# in this order.
+STRATEGIES = [("Champions", "sample-tribes-champions"),
+              ("Random", "sample-tribes-random"),
+              ("Volumetric", "sample-tribes-volumetric")]
+
+
+def configured_strategies(sampling_cfg, names=None):
+    """
+    :param sampling_cfg: dict; configuration of the sample_tribes step
+    :param names: list; names of the strategies to run. Default: all that are configured
+    :return: list of tuples; (name, module implementing it) for each strategy to run
+    """
+    if names is None or len(names) == 0:
+        names = [_name for _name, _ in STRATEGIES if _name in sampling_cfg]
+    for name in names:
+        assert name in dict(STRATEGIES), "Unknown sampling strategy: {0}".format(name)
+        assert name in sampling_cfg, "Sampling strategy {0} not configured!".format(name)
+    return [(_name, importlib.import_module(_source)) for _name, _source in STRATEGIES if _name in names]
+
+
+def run_all_strategies(db, sampling_cfg, strategies, workers=None):
+    """
+    Run a number of sampling strategies concurrently on the same database. Each strategy draws from its own random
+    stream, seeded as configured, so the results do not depend on the order in which they are run.
+    :param db: pandas.DataFrame; topological database with all columns required by the strategies
+    :param sampling_cfg: dict; configuration of the sample_tribes step
+    :param strategies: list of tuples; (name, module) as returned by configured_strategies
+    :param workers: int; number of threads. Default: one per strategy
+    :return: dict; the samples of all strategies, merged
+    """
+    def run(strategy):
+        name, module = strategy
+        return module.make_all_samples(db, sampling_cfg[name])
+
+    pool = ThreadPool(workers or max(len(strategies), 1))
+    try:
+        results = pool.map(run, strategies)
+    finally:
+        pool.close()
+        pool.join()
+
+    out_dict = {}
+    for (name, _), samples in zip(strategies, results):
+        duplicate = [_k for _k in samples.keys() if _k in out_dict]
+        if len(duplicate) > 0:
+            raise Exception("Sampling strategy {0} writes {1}, which another strategy already wrote!".format(
+                name, ", ".join(duplicate)))
+        out_dict.update(samples)
+    return out_dict
+
+
+def write_output(data, output_config):
+    """
+    Merge the samples into the existing output, if any, and write it. The file is written to a temporary file first
+    and then moved into place, so it is either in its old or its new state. Binary tribes store if the file name ends
+    in .h5, else .json.
+    """
+    update_tribes(data, output_config["tribes"])
+
+
+def main(path_to_config, strategy_names=None, workers=None):
+    # Read the meta-config file
+    cfg = config.Config(path_to_config)
+    # Get configuration related to the current pipeline stage
+    stage = cfg.stage("sample_tribes")
+    strategies = configured_strategies(stage["config"], strategy_names)
+    # The database is read once, with the columns required by any of the strategies
+    columns = []
+    for name, module in strategies:
+        columns.extend([_col for _col in module.required_columns(stage["config"][name]) if _col not in columns])
+    db = read_database(stage["inputs"]["database"], columns=columns)
+    samples = run_all_strategies(db, stage["config"], strategies, workers=workers)
+    write_output(samples, stage["outputs"])
+
+
+if __name__ == "__main__":
+    import sys
+    import getopt
+
+    opts, args = getopt.getopt(sys.argv[1:], "w:", ["workers="])
+    opts = dict(opts)
+    n_workers = opts.get("--workers", opts.get("-w", None))
+    main(args[0], strategy_names=args[1:], workers=None if n_workers is None else int(n_workers))
@@ -11,32 +11,44 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General
 You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import os
-
 import numpy
-import pandas
-import json
 
 from toposample import config
-from toposample.db import get_column_from_database
+from toposample.data import update_tribes
+from toposample.db import read_database, is_columnar, ColumnarDatabase, ReducedColumns, top_n
 
 
-def read_input(input_config):
-    db = pandas.read_pickle(input_config["database"])
+def read_input(input_config, columns=None):
+    if is_columnar(input_config["database"]):
+        # Columns are read when needed, vectors as one memory mapped array
+        return ColumnarDatabase(input_config["database"])
+    db = read_database(input_config["database"], columns=columns)
     return db
 
 
-# noinspection PyPep8Naming
-def pick_champs_from_column(db, column, N, index=None, function=None):
-    decider = get_column_from_database(db, column, index=index, function=function)
-    picked = numpy.argsort(decider)[-N:]
-    return db.index[picked]
+def required_columns(full_specification):
+    return ["tribe"] + [spec["value"]["column"] for spec in full_specification["Specifiers"]]
 
 
-def random_subsample(base_samples, ss_specs, specifier):
+# noinspection PyPep8Naming
+def pick_champs_from_column(reduced, column, N, index=None, function=None, candidates=None):
+    """
+    :param reduced: toposample.db.ReducedColumns; the database
+    :param column, index, function: specify the value to decide by, see toposample.db.get_column_from_database
+    :param N: int; number of champions
+    :param candidates: numpy.array; positions of the rows to pick from. Default: all
+    :return: numpy.array; positions of the rows with the N largest values
+    """
+    decider = reduced.get(column, index=index, function=function)
+    if candidates is None:
+        return top_n(decider, N)
+    return candidates[top_n(decider[candidates], N)]
+
+
+def random_subsample(base_samples, ss_specs, specifier, rng):
     m = ss_specs["number_samples"]
     n = ss_specs["number_subsamples"]
-    chosen_samples = numpy.random.choice(list(base_samples.keys()),
+    chosen_samples = rng.choice(list(base_samples.keys()),
                                          numpy.minimum(m, len(base_samples)),
                                          replace=False)
     out_dict = {}
@@ -46,7 +58,7 @@ def random_subsample(base_samples, ss_specs, specifier):
         for _ in range(n):
             for smpl in chosen_samples:
                 gids = base_samples[smpl]["gids"]
-                gids = numpy.random.choice(gids, int(len(gids) * lvl / 100), replace=False)
+                gids = rng.choice(gids, int(len(gids) * lvl / 100), replace=False)
                 ss_dict[str(idxx)] = {"gids": gids.tolist(),
                                       "parent": specifier + "/" + str(smpl),
                                       "level": lvl
@@ -56,49 +68,51 @@ def random_subsample(base_samples, ss_specs, specifier):
 
 
 # noinspection PyPep8Naming
-def make_sample(db, specifications):
+def make_sample(reduced, specifications, candidates=None):
     N = specifications["number"]
     spec_val = specifications["value"]
-    chiefs = pick_champs_from_column(db, spec_val["column"], N, index=spec_val.get("index", None),
-                                     function=spec_val.get("function", None))
+    chiefs = pick_champs_from_column(reduced, spec_val["column"], N, index=spec_val.get("index", None),
+                                     function=spec_val.get("function", None), candidates=candidates)
 
     out_dict = {specifications["name"]: {}}
     for i, chief in enumerate(chiefs):
-        gids = db["tribe"].loc[chief].astype(int)
+        gids = reduced.entry("tribe", chief).astype(int)
         out_dict[specifications["name"]][str(i)] = {
             "gids": gids.tolist(),
-            "chief": int(chief)
+            "chief": int(reduced.index[chief])
         }
     return out_dict
 
 
-def filter_by_minimum_tribe_size(db, min_size):
-    tribal_size = numpy.array(list(map(len, db["tribe"])))
-    return db.iloc[tribal_size > min_size]
+def filter_by_minimum_tribe_size(reduced, min_size):
+    """Positions of the rows with tribes larger than min_size"""
+    return numpy.nonzero(reduced.lengths("tribe") > min_size)[0]
 
 
 def make_all_samples(db, full_specification):
-    db = filter_by_minimum_tribe_size(db, full_specification.get("Minimum size", 0))
+    """
+    :param db: pandas.DataFrame or toposample.db.ColumnarDatabase; topological database
+    :param full_specification: dict; configuration of the Champions sampling
+    :return: dict; the samples
+    """
+    # All specifiers look up their values in the same reduced columns, each of which is evaluated only once
+    reduced = ReducedColumns(db)
+    candidates = filter_by_minimum_tribe_size(reduced, full_specification.get("Minimum size", 0))
     spec_lbl = full_specification["Specifier_label"]
+    # Own random stream for the subsampling, such that it only depends on the seed
+    rng = numpy.random.RandomState(full_specification.get("seed", 4242))
     out_dict = dict([(spec_lbl, {})])
     for spec in full_specification["Specifiers"]:
-        out_dict[spec_lbl].update(make_sample(db, spec))
+        out_dict[spec_lbl].update(make_sample(reduced, spec, candidates=candidates))
         if "subsampling" in spec:
-            ss_dict = random_subsample(out_dict[spec_lbl][spec["name"]], spec["subsampling"], spec["name"])
+            ss_dict = random_subsample(out_dict[spec_lbl][spec["name"]], spec["subsampling"], spec["name"], rng)
             out_dict.setdefault("subsampled", {}).update(ss_dict)
     return out_dict
 
 
 def write_output(data, output_config):
-    if os.path.exists(output_config["tribes"]):
-        with open(output_config["tribes"], "r") as fid:
-            existing_config = json.load(fid)
-            existing_config.update(data)
-        with open(output_config["tribes"], "w") as fid:
-            json.dump(existing_config, fid, indent=2)
-    else:
-        with open(output_config["tribes"], "w") as fid:
-            json.dump(data, fid, indent=2)
+    # Binary tribes store if the file name ends in .h5, else .json
+    update_tribes(data, output_config["tribes"])
 
 
 def main(path_to_config):
@@ -106,7 +120,7 @@ def main(path_to_config):
     cfg = config.Config(path_to_config)
     # Get configuration related to the current pipeline stage
     stage = cfg.stage("sample_tribes")
-    db = read_input(stage["inputs"])
+    db = read_input(stage["inputs"], columns=required_columns(stage["config"]["Champions"]))
     tribes = make_all_samples(db, stage["config"]["Champions"])
     write_output(tribes, stage["outputs"])
 
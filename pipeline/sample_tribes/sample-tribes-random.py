@@ -11,32 +11,35 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General
 You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import os
-
 import numpy
 import pandas
-import json
 
 from scipy import spatial
 from toposample import config
+from toposample.data import update_tribes
+from toposample.db import read_database
 
 
-def read_input(input_config):
-    db = pandas.read_pickle(input_config["database"])
+def read_input(input_config, columns=None):
+    db = read_database(input_config["database"], columns=columns)
     return db
 
 
-def pick_random_where_column_has_certain_value(db, column, value, N):
+def required_columns(full_specification):
+    return ["tribe"] + [spec["value"]["column"] for spec in full_specification["Specifiers"]]
+
+
+def pick_random_where_column_has_certain_value(db, column, value, N, rng):
     valid = db[column] == value  # numpy.bytes_(value)
     valid_index = db.index[valid]
-    return numpy.random.choice(valid_index, numpy.minimum(N, len(valid_index)), replace=False)
+    return rng.choice(valid_index, numpy.minimum(N, len(valid_index)), replace=False)
 
 
-def make_sample(db, specifications):
+def make_sample(db, specifications, rng):
     assert "subsampling" not in specifications, "Subsampling not supported for random samples!"
     N = specifications["number"]
     spec_val = specifications["value"]
-    random_chiefs = pick_random_where_column_has_certain_value(db, spec_val["column"], spec_val["value"], N)
+    random_chiefs = pick_random_where_column_has_certain_value(db, spec_val["column"], spec_val["value"], N, rng)
 
     out_dict = {specifications["name"]: {}}
     for i, chief in enumerate(random_chiefs):
@@ -50,23 +53,17 @@ def make_sample(db, specifications):
 
 def make_all_samples(db, full_specification):
     spec_lbl = full_specification["Specifier_label"]
-    numpy.random.seed(full_specification.get("seed", 9001))
+    # Own random stream, such that the samples only depend on the seed, even when run alongside other strategies
+    rng = numpy.random.RandomState(full_specification.get("seed", 9001))
     out_dict = dict([(spec_lbl, {})])
     for spec in full_specification["Specifiers"]:
-        out_dict[spec_lbl].update(make_sample(db, spec))
+        out_dict[spec_lbl].update(make_sample(db, spec, rng))
     return out_dict
 
 
 def write_output(data, output_config):
-    if os.path.exists(output_config["tribes"]):
-        with open(output_config["tribes"], "r") as fid:
-            existing_config = json.load(fid)
-            existing_config.update(data)
-        with open(output_config["tribes"], "w") as fid:
-            json.dump(existing_config, fid, indent=2)
-    else:
-        with open(output_config["tribes"], "w") as fid:
-            json.dump(data, fid, indent=2)
+    # Binary tribes store if the file name ends in .h5, else .json
+    update_tribes(data, output_config["tribes"])
 
 
 def main(path_to_config):
@@ -74,7 +71,7 @@ def main(path_to_config):
     cfg = config.Config(path_to_config)
     # Get configuration related to the current pipeline stage
     stage = cfg.stage("sample_tribes")
-    db = read_input(stage["inputs"])
+    db = read_input(stage["inputs"], columns=required_columns(stage["config"]["Random"]))
     tribes = make_all_samples(db, stage["config"]["Random"])
     write_output(tribes, stage["outputs"])
 
@@ -11,31 +11,105 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General
 You should have received a copy of the GNU Affero General Public License along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import os
-
 import numpy
 import pandas
-import json
 
 from scipy import spatial
 from toposample import config
+from toposample.data import update_tribes
+from toposample.db import read_database, read_tribes
+from toposample.indexing import GidConverter, Tribes
 
 
-def read_input(input_config):
-    db = pandas.read_pickle(input_config["database"])
+def read_input(input_config, columns=None):
+    db = read_database(input_config["database"], columns=columns)
     return db
 
 
-def pick_random_neurons_volumetric(db, radius, offset, M):
-    locations = db[['x', 'y', 'z']]
-    center = locations.values.mean(axis=0) + offset
-    D = spatial.distance.cdist(numpy.array([center]), locations)[0]
-    gids = locations.index.values[D <= radius]
-    return numpy.random.choice(gids, numpy.minimum(M, len(gids)), replace=False)
-
-
-def find_subtribes(db, base_samples, st_specs, specifier):
-    db_tribes = db["tribe"]
+def required_columns(full_specification):
+    subtribes = any(["subtribes" in spec for spec in full_specification["Specifiers"]])
+    return ["x", "y", "z"] + (["tribe"] if subtribes else [])
+
+
+class NeuronLocations(object):
+    """
+    Spatial index over the locations of the neurons. Built once per run and used for all samples.
+    """
+    def __init__(self, db):
+        """
+        :param db: pandas.DataFrame; with columns x, y and z, indexed by gid
+        """
+        locations = db[['x', 'y', 'z']]
+        self.gids = locations.index.values
+        self.center = locations.values.mean(axis=0)
+        self.tree = spatial.cKDTree(locations.values)
+
+    def within(self, offsets, radius):
+        """
+        :param offsets: numpy.array of shape (N, 3); offsets of the centers of N balls from the center of all neurons
+        :param radius: float; radius of the balls
+        :return: list; for each ball the gids of the neurons within it, in the order of the database
+        """
+        centers = self.center + numpy.reshape(offsets, (-1, 3))
+        return [self.gids[numpy.sort(numpy.asarray(_idx, dtype=int))]
+                for _idx in self.tree.query_ball_point(centers, radius)]
+
+
+def pick_random_neurons_volumetric(locations, radius, offsets, M, rng):
+    """
+    :param locations: NeuronLocations
+    :param radius: float; radius of the volumes to sample from
+    :param offsets: numpy.array of shape (N, 3); offsets of the centers of the volumes from the center of all neurons
+    :param M: int; number of neurons to pick from each volume (or all of them if there are fewer)
+    :param rng: numpy.random.RandomState
+    :return: list; for each volume the gids of the picked neurons
+    """
+    return [rng.choice(gids, numpy.minimum(M, len(gids)), replace=False)
+            for gids in locations.within(offsets, radius)]
+
+
+def largest_subtribes(tribes, conv, gids, num_tribes):
+    """
+    Find the subtribes of the neurons in a sample, i.e. their tribes restricted to the neurons in the sample, and pick
+    the largest ones
+    :param tribes: toposample.indexing.Tribes; the tribes of all neurons, tribe i being the one of the neuron at local
+    index i
+    :param conv: toposample.indexing.GidConverter
+    :param gids: numpy.array; gids of the neurons in the sample
+    :param num_tribes: int; number of subtribes to pick
+    :return: tuple; chiefs of the picked subtribes (numpy.array of gids) and list of their members (numpy.arrays of
+    gids, sorted). Largest subtribe first; subtribes of equal size in the order of their chiefs in the sample.
+    """
+    sample = conv.indices(gids)
+    in_sample = numpy.zeros(len(tribes.population_gids), dtype=bool)
+    in_sample[sample] = True
+
+    # Positions in tribes.indices of the members of the tribes of all neurons in the sample
+    starts = tribes.indptr[sample]
+    lengths = tribes.indptr[sample + 1] - starts
+    member_idx = numpy.repeat(starts - numpy.cumsum(lengths) + lengths, lengths) + numpy.arange(lengths.sum())
+    inside = in_sample[tribes.indices[member_idx]]
+    sizes = numpy.bincount(numpy.repeat(numpy.arange(len(sample)), lengths)[inside], minlength=len(sample))
+
+    num_tribes = min(num_tribes, len(sample))
+    if num_tribes == 0:
+        return gids[:0], []
+    top = numpy.argpartition(-sizes, num_tribes - 1)[:num_tribes]
+    # Subtribes of the smallest selected size are taken in the order of the sample, such that the result is unique
+    threshold = sizes[top].min()
+    above = numpy.nonzero(sizes > threshold)[0]
+    top = numpy.hstack([above, numpy.nonzero(sizes == threshold)[0][:num_tribes - len(above)]])
+    top = top[numpy.lexsort((top, -sizes[top]))]
+
+    offsets = numpy.hstack([0, numpy.cumsum(lengths)])
+    subtribes = [numpy.sort(tribes.population_gids[tribes.indices[member_idx[offsets[i]:offsets[i + 1]]
+                                                                  [inside[offsets[i]:offsets[i + 1]]]]])
+                 for i in top]
+    return gids[top], subtribes
+
+
+def find_subtribes(tribes, base_samples, st_specs, specifier):
+    conv = GidConverter(pandas.DataFrame(index=pandas.Index(tribes.population_gids)))
     num_samples = st_specs["number_samples"]
     num_tribes = st_specs["number_tribes"]
     chosen_samples = sorted(base_samples.keys(), key=int)[:num_samples]
@@ -43,27 +117,15 @@ def find_subtribes(db, base_samples, st_specs, specifier):
     out_dict = {}
     for smpl in chosen_samples:
         st_dict = out_dict.setdefault(specifier + '@' + str(smpl), {})
-        gids = base_samples[smpl]["gids"]
-        
-        # Find subtribes in volumetric sample
-        db_subtribes = db_tribes.loc[gids]
-        for gid in gids:
-            db_subtribes.loc[gid] = numpy.intersect1d(db_subtribes.loc[gid], gids, assume_unique=True).tolist()
-        
-        # Select N largest tribes
-        db_subtribes = db_subtribes.to_frame()
-        db_subtribes['size'] = 0
-        for gid in gids:
-            db_subtribes.loc[gid, 'size'] = len(db_subtribes.loc[gid, 'tribe'])
+        gids = numpy.asarray(base_samples[smpl]["gids"])
         
-        db_subtribes.sort_values('size', ascending=False, inplace=True)
-        subtribes_gids = db_subtribes['tribe'].iloc[:num_tribes].to_list()
-        subtribes_chief = db_subtribes.index[:num_tribes].to_list()
+        # Find subtribes in volumetric sample and select N largest
+        subtribes_chief, subtribes_gids = largest_subtribes(tribes, conv, gids, num_tribes)
         
         # Add to dict
-        for idxx in range(num_tribes):
-            st_dict[str(idxx)] = {"gids": subtribes_gids[idxx],
-                                  "chief": subtribes_chief[idxx]
+        for idxx in range(len(subtribes_chief)):
+            st_dict[str(idxx)] = {"gids": subtribes_gids[idxx].tolist(),
+                                  "chief": subtribes_chief[idxx].item()
                                  }
     return out_dict
 
@@ -89,17 +151,17 @@ def add_random_subtribes(base_samples, st_dict, st_specs, rng):
     return out_dict
 
 
-def make_sample(db, specifications, offset_amplitudes):
+def make_sample(locations, specifications, offset_amplitudes, rng):
     assert "subsampling" not in specifications, "Subsampling not supported for volumetric samples!"
     N = specifications["number"]
     M = specifications["neuron_count"]
     radius = specifications["value"]
     offset_amplitudes = numpy.array(offset_amplitudes)
-    offsets = numpy.random.rand(N, 3) * offset_amplitudes - offset_amplitudes / 2
+    offsets = rng.rand(N, 3) * offset_amplitudes - offset_amplitudes / 2
 
     out_dict = {specifications["name"]: {}}
-    for i, offset in enumerate(offsets):
-        gids = pick_random_neurons_volumetric(db, radius, offset, M)
+    samples = pick_random_neurons_volumetric(locations, radius, offsets, M, rng)
+    for i, (offset, gids) in enumerate(zip(offsets, samples)):
         out_dict[specifications["name"]][str(i)] = {
             "gids": gids.tolist(),
             "center_offset": offset.tolist()
@@ -107,16 +169,27 @@ def make_sample(db, specifications, offset_amplitudes):
     return out_dict
 
 
-def make_all_samples(db, full_specification):
+def make_all_samples(db, full_specification, tribes=None):
+    """
+    :param db: pandas.DataFrame; topological database, with at least the columns x, y and z
+    :param full_specification: dict; configuration of the volumetric samples
+    :param tribes: toposample.indexing.Tribes; tribe i being the one of the neuron in row i of db. Only needed for
+    subtribes. Default: taken from the column "tribe" of db
+    :return: dict; the samples
+    """
     offset_amplitude = full_specification["Arguments"]["offset_amplitudes"]
     spec_lbl = full_specification["Specifier_label"]
-    numpy.random.seed(full_specification.get("seed", 1337))
+    # Own random stream, such that the samples only depend on the seed, even when run alongside other strategies
+    rng = numpy.random.RandomState(full_specification.get("seed", 1337))
     rng_subtr = numpy.random.default_rng(seed=full_specification.get("seed_subtribes", 2559)) # Separate RNG so that random control sampling of subtribes (if selected) not interfering with volumetric sampling
     out_dict = dict([(spec_lbl, {})])
+    locations = NeuronLocations(db)
     for spec in full_specification["Specifiers"]:
-        out_dict[spec_lbl].update(make_sample(db, spec, offset_amplitude))
+        out_dict[spec_lbl].update(make_sample(locations, spec, offset_amplitude, rng))
         if "subtribes" in spec:
-            st_dict = find_subtribes(db, out_dict[spec_lbl][spec["name"]], spec["subtribes"], spec["name"])          
+            if tribes is None:
+                tribes = Tribes.from_gid_lists(db["tribe"], db.index)
+            st_dict = find_subtribes(tribes, out_dict[spec_lbl][spec["name"]], spec["subtribes"], spec["name"])          
             out_dict.setdefault("subtribes", {}).update(st_dict)
             
             rnd_dict = add_random_subtribes(out_dict[spec_lbl], st_dict, spec["subtribes"], rng_subtr) # Generates random samples with exact same sizes as subtribes
@@ -125,15 +198,8 @@ def make_all_samples(db, full_specification):
 
 
 def write_output(data, output_config):
-    if os.path.exists(output_config["tribes"]):
-        with open(output_config["tribes"], "r") as fid:
-            existing_config = json.load(fid)
-            existing_config.update(data)
-        with open(output_config["tribes"], "w") as fid:
-            json.dump(existing_config, fid, indent=2)
-    else:
-        with open(output_config["tribes"], "w") as fid:
-            json.dump(data, fid, indent=2)
+    # Binary tribes store if the file name ends in .h5, else .json
+    update_tribes(data, output_config["tribes"])
 
 
 def main(path_to_config):
@@ -141,9 +207,10 @@ def main(path_to_config):
     cfg = config.Config(path_to_config)
     # Get configuration related to the current pipeline stage
     stage = cfg.stage("sample_tribes")
-    db = read_input(stage["inputs"])
-    tribes = make_all_samples(db, stage["config"]["Volumetric"])
-    write_output(tribes, stage["outputs"])
+    db = read_input(stage["inputs"], columns=["x", "y", "z"])
+    tribes = read_tribes(stage["inputs"]["database"])
+    samples = make_all_samples(db, stage["config"]["Volumetric"], tribes=tribes)
+    write_output(samples, stage["outputs"])
 
 
 if __name__ == "__main__":
@@ -18,9 +18,9 @@ from scipy.stats import pearsonr
 
 from toposample import Config, TopoData
 from toposample.data import read_h5_dataset
-from toposample.db import get_column_from_database
+from toposample.db import get_column_from_database, read_database
 
-from parameters_for_tribes import top_n_weighted_average, tribal_spectrum
+from parameters_for_tribes import top_n_weighted_average, tribal_spectrum, required_columns
 
 
 def read_inputs(cfg):
@@ -28,7 +28,7 @@ def read_inputs(cfg):
     acc_fn = cfg._cfg["analyzed"]["classifier_components_results"]
     tribes_fn = cfg._cfg["analyzed"]["tribes"]
     stage_cfg = cfg.stage("struc_tribe_analysis")["config"]
-    db = pandas.read_pickle(db_fn)
+    db = read_database(db_fn, columns=required_columns(stage_cfg["Parameters"]))
     acc_data = TopoData(acc_fn, follow_link_functions={"data_fn": (read_h5_dataset("scores"), False)})
     acc_data = acc_data["data_fn"].filter(sampling="Radius").map(numpy.nanmean)
     gids = TopoData(tribes_fn)["gids"].filter(sampling="Radius")
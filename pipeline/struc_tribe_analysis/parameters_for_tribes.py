@@ -17,12 +17,20 @@ import json
 
 from toposample import config
 from toposample import TopoData
-from toposample.db import get_entry_from_row, get_column_from_database
+from toposample.db import get_entry_from_row, read_database, ReducedColumns
 from toposample.indexing import GidConverter
 
 
-def read_input(input_config):
-    db = pandas.read_pickle(input_config["database"])
+def required_columns(list_of_parameters):
+    columns = ["tribe"]
+    for param_spec in list_of_parameters:
+        if param_spec["value"]["column"] not in columns:
+            columns.append(param_spec["value"]["column"])
+    return columns
+
+
+def read_input(input_config, columns=None):
+    db = read_database(input_config["database"], columns=columns)
     tribes = TopoData(input_config["tribes"])
     tribal_chiefs = tribes["chief"]
     tribal_gids = tribes["gids"]
@@ -61,12 +69,13 @@ def top_n_weighted_average(w, v, number_sampled=10):
 
 def get_relevant_columns_from_db(db, list_of_parameters):
     out_dict = {}
+    reduced = ReducedColumns(db)
     print("Looking up relevant db entries...")
     for param_spec in list_of_parameters:
         print("...{0}".format(param_spec["name"]))
-        v = get_column_from_database(db, param_spec["value"]["column"],
-                                     index=param_spec["value"].get("index", None),
-                                     function=param_spec["value"].get("function", None))
+        v = reduced.get(param_spec["value"]["column"],
+                        index=param_spec["value"].get("index", None),
+                        function=param_spec["value"].get("function", None))
         out_dict[param_spec["name"]] = numpy.array(v)
     return out_dict
 
@@ -123,7 +132,8 @@ def main(path_to_config):
     cfg = config.Config(path_to_config)
     # Get configuration related to the current pipeline stage
     stage = cfg.stage("struc_tribe_analysis")
-    db, tribal_chiefs, tribal_gids = read_input(stage["inputs"])
+    db, tribal_chiefs, tribal_gids = read_input(stage["inputs"],
+                                                columns=required_columns(stage["config"]["Parameters"]))
     tribal_values = lookup_parameters(db, tribal_chiefs, tribal_gids, stage["config"])
     write_output(tribal_values, stage["outputs"])
 